@@ -1,13 +1,23 @@
 import sys
 import json
 import re
+import threading
 from shared import vectorstore, query_llm
+from metrics import stage
+import deadline
 from agent1_module import ProductDetailAgent
 
 """Agent 2: Community subsidy lookup and aggregation.This module defines `Agent2`, which retrieves context for a given community ID
 from a vector store, prompts an LLM to extract the discount per kg for a specified subsidy level, and combines that with product info produced by
 `ProductDetailAgent`."""
 
+_NUMBER = re.compile(r"\d+(?:\.\d+)?")
+
+
+def _parse_json(text):
+    return json.loads(re.search(r'\{.*\}', text, re.DOTALL).group())
+
+
 class Agent2:
     """Agent that extracts discount information for a community.
 
@@ -15,14 +25,36 @@ class Agent2:
     vector store and queries an LLM to extract the discount per kg for a
     specific subsidy level.
     """
-    def __init__(self, community_id):
-        """Initialize with a community identifier and prefetch context.
+    def __init__(self, community_id, store=None):
+        """Initialize with a community identifier; context is retrieved on first use.
         Args:
             community_id: Community identifier string used for retrieval and
                 table row matching in the LLM prompt.
+            store: Optional object with a `similarity_search(query, k)` method;
+                defaults to the shared Weaviate vector store.
         """
         self.community_id = community_id.strip()
-        self.context = self.get_relevant_context()
+        self.store = store if store is not None else vectorstore
+        self._context = None
+        self._context_lock = threading.Lock()
+
+    @property
+    def context(self) -> str:
+        """Community table context, fetched from the vector store once.
+
+        Cached agents are shared by concurrent tasks under CELERY_POOL=threads,
+        so the first fetch is locked: one retrieval per agent, not one per task.
+        """
+        if self._context is None:
+            with self._context_lock:
+                if self._context is None:
+                    self._context = self.get_relevant_context()
+        return self._context
+
+    @property
+    def context_missing(self) -> bool:
+        """True once retrieval has run and come back empty (store down or no rows)."""
+        return self._context == ""
 
     def get_relevant_context(self, top_k=20, max_words=2500) -> str:
         """Retrieve concatenated text context for the community.
@@ -34,7 +66,9 @@ class Agent2:
             A single string containing the top-k results truncated to
             `max_words`, used as the table context in prompts.
         """
-        results = vectorstore.similarity_search(self.community_id, k=top_k)
+        deadline.check("retrieval")
+        with stage("retrieval"):
+            results = self.store.similarity_search(self.community_id, k=top_k)
         combined = "\n".join([doc.page_content for doc in results if doc.page_content])
 
         words = combined.split()
@@ -55,7 +89,9 @@ class Agent2:
                 but may return "Not found".
 
         Returns:
-            A dict with keys `community_id` and `discount_per_kg`.
+            A dict with keys `community_id` and `discount_per_kg`, plus
+            `validated: False` when no model's answer passed
+            `is_valid_answer`.
         """
         
         prompt = f"""
@@ -121,10 +157,12 @@ class Agent2:
         Table:
         {self.context}
         """
-        result = query_llm(prompt)
+        result, validated = query_llm(prompt, validate=self.is_valid_answer)
         try:
-            json_str = re.search(r'\{.*\}', result, re.DOTALL).group()
-            return json.loads(json_str)
+            info = _parse_json(result)
+            if not validated:
+                info["validated"] = False
+            return info
         except Exception as e:
             print("Failed to extract JSON:", e)
             return {
@@ -132,6 +170,23 @@ class Agent2:
                 "discount_per_kg": "None"
             }
 
+    def is_valid_answer(self, text):
+        """Check an LLM answer before accepting it from the fast model.
+
+        The answer must be JSON whose `discount_per_kg` is a plain number that
+        appears in the retrieved context, on the community's own row(s) when
+        the context has any.
+        """
+        try:
+            value = str(_parse_json(text).get("discount_per_kg", "")).strip()
+        except Exception:
+            return False
+        if not _NUMBER.fullmatch(value):
+            return False
+        rows = [line for line in self.context.splitlines() if self.community_id in line]
+        haystack = "\n".join(rows) if rows else self.context
+        return float(value) in {float(n) for n in _NUMBER.findall(haystack)}
+
     def run(self, product_info):
         """Combine product info with community discount information.
 
@@ -150,6 +205,8 @@ class Agent2:
             "community_id": self.community_id,
             "discount_per_kg": discount_info.get("discount_per_kg", "Not found")
         }
+        if discount_info.get("validated") is False:
+            final_info["validated"] = False
         print("\nAgent2 is working:", final_info)
         return final_info
 
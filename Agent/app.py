@@ -1,14 +1,40 @@
 
 import streamlit as st
-from typing import List
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Optional, Tuple
 from Agent.agent1_module import ProductDetailAgent
 from Agent.Agent2 import Agent2
 
+MAX_WORKERS = 8
+
 st.set_page_config(page_title="Subsidy Calculator Agent", layout="centered")
 
 st.title("🧮 Subsidy Calculator Agent")
 st.markdown("Use this tool to calculate product subsidy discounts for a specific community. Add multiple products dynamically and compute subsidies.")
 
+@st.cache_resource(ttl=600, show_spinner="Loading product catalog...")
+def get_product_agent() -> ProductDetailAgent:
+    """One catalog load per server process, refreshed every ten minutes."""
+    return ProductDetailAgent()
+
+@st.cache_resource(ttl=3600, max_entries=128, show_spinner="Retrieving community subsidy table...")
+def get_community_agent(community_id: str) -> Agent2:
+    """One Agent2 per community, with its retrieval context already fetched.
+
+    Raises LookupError when retrieval comes back empty so the miss is not cached.
+    """
+    agent = Agent2(community_id)
+    if not agent.context:
+        raise LookupError(f"No subsidy context retrieved for {community_id}")
+    return agent
+
+def process_product(agent1: ProductDetailAgent, agent2: Agent2, pname: str) -> Tuple[dict, Optional[dict]]:
+    """Run Agent1 then Agent2 for one product; safe to call from worker threads."""
+    product_state = agent1.extract_product_details(pname)
+    if not product_state.get("subsidy_level"):
+        return product_state, None
+    return product_state, agent2.run(product_state)
+
 if "product_inputs" not in st.session_state:
     st.session_state.product_inputs = [""]
 
@@ -31,27 +57,45 @@ if st.button("Calculate Subsidies"):
     if not product_inputs or not community_id.strip():
         st.warning("Please enter at least one product and a community ID.")
     else:
-        agent1 = ProductDetailAgent()
-
-        for pname in product_inputs:
-            st.markdown(f"---\n### 🛠️ Processing for **{pname}**")
-            st.info("Agent1 is working...")
-            product_state = agent1.extract_product_details(pname)
-            st.json(product_state)
-
-            if not product_state.get("subsidy_level"):
-                st.error(f"Could not determine subsidy level for {pname}. Skipping.")
-                continue
-
-            st.info(f"Agent2 is working for Community ID: `{community_id}`")
-            agent2 = Agent2(community_id)
-            result = agent2.run(product_state)
-            st.json(result)
-
-            st.success(
-                f"For product **{result['product_name']}**, subsidy level is **{result['subsidy_level']}** "
-                f"in **{result['community_id']}**, and the discount per kg is **${result['discount_per_kg']}**."
-            )
+        agent1 = get_product_agent()
+        try:
+            agent2 = get_community_agent(community_id.strip())
+        except LookupError as e:
+            st.warning(f"{e}; results may be incomplete.")
+            agent2 = Agent2(community_id.strip())
+
+        # Placeholders keep the input order while results arrive as each finishes.
+        slots = {}
+        for i, pname in enumerate(product_inputs):
+            slot = st.container()
+            slot.markdown(f"---\n### 🛠️ Processing for **{pname}**")
+            slots[i] = (slot, slot.empty())
+            slots[i][1].info("Agent1 and Agent2 are working...")
+
+        with ThreadPoolExecutor(max_workers=min(MAX_WORKERS, len(product_inputs))) as pool:
+            futures = {pool.submit(process_product, agent1, agent2, pname): i for i, pname in enumerate(product_inputs)}
+            for future in as_completed(futures):
+                i = futures[future]
+                pname = product_inputs[i]
+                slot, status = slots[i]
+                try:
+                    product_state, result = future.result()
+                except Exception as e:
+                    status.error(f"Failed to process {pname}: {e}")
+                    continue
+
+                status.empty()
+                slot.json(product_state)
+                if result is None:
+                    slot.error(f"Could not determine subsidy level for {pname}. Skipping.")
+                    continue
+
+                slot.info(f"Agent2 result for Community ID: `{community_id}`")
+                slot.json(result)
+                slot.success(
+                    f"For product **{result['product_name']}**, subsidy level is **{result['subsidy_level']}** "
+                    f"in **{result['community_id']}**, and the discount per kg is **${result['discount_per_kg']}**."
+                )
 
 st.markdown("---")
 st.caption("Built with using Streamlit.")
\ No newline at end of file
@@ -0,0 +1,2 @@
+"""Benchmarks for Agentic-AI. Run from the Agent directory, e.g.
+`python -m benchmarks.weaviate_protocols`."""
@@ -0,0 +1,109 @@
+"""Local Geoapify-compatible geocoding endpoint for address validation.
+
+Lets `/validate-address/` and `/validate-address/bulk` run end to end
+without Geoapify:
+
+    python -m benchmarks.fake_geocoder --port 8090 --latency-ms 200 --rate 10
+
+    GEOCODER_BASE_URL=http://localhost:8090 uvicorn main:app
+
+    curl -N localhost:8000/validate-address/bulk -H 'Content-Type: application/json' \
+        -d '{"items": [{"address": "12 Main St, Iqaluit, NU", "community_name": "Iqaluit"}]}'
+
+`/v1/geocode/search?text=...` resolves an address to the second
+comma-separated part of its text ("12 Main St, Iqaluit, NU" -> "Iqaluit").
+Addresses with no comma are not found. With `--rate`, requests beyond that
+many per second get 429 with a Retry-After header, like the real provider.
+`--error-rate` answers that share of requests with 503. The server prints
+the number of requests it served on exit, which shows how many geocodes a
+deduplicated batch really cost.
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+
+def make_handler(latency_ms: float, rate: float, error_rate: float, stats: dict):
+    lock = threading.Lock()
+    window = {"second": 0, "count": 0}
+
+    def over_rate() -> bool:
+        if rate <= 0:
+            return False
+        with lock:
+            second = int(time.time())
+            if window["second"] != second:
+                window["second"], window["count"] = second, 0
+            window["count"] += 1
+            return window["count"] > rate
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            url = urlsplit(self.path)
+            if url.path.rstrip("/") != "/v1/geocode/search":
+                self.send_error(404)
+                return
+            with lock:
+                stats["requests"] += 1
+            if over_rate():
+                with lock:
+                    stats["throttled"] += 1
+                self.send_response(429)
+                self.send_header("Retry-After", "1")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            if error_rate and random.random() < error_rate:
+                self.send_error(503)
+                return
+            time.sleep(latency_ms / 1000)
+
+            text = parse_qs(url.query).get("text", [""])[0]
+            parts = [p.strip() for p in text.split(",")]
+            features = []
+            if len(parts) > 1 and parts[1]:
+                features.append({
+                    "type": "Feature",
+                    "properties": {"city": parts[1], "formatted": text, "postcode": ""},
+                    "geometry": {"type": "Point", "coordinates": [-68.5, 63.7]},
+                })
+            payload = json.dumps({"type": "FeatureCollection", "features": features}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Fake Geoapify-compatible geocoding server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--latency-ms", type=float, default=100.0, help="Simulated provider latency per request")
+    parser.add_argument("--rate", type=float, default=0.0, help="Requests per second before answering 429 (0: no limit)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of requests answered with 503")
+    args = parser.parse_args()
+
+    stats = {"requests": 0, "throttled": 0}
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(args.latency_ms, args.rate, args.error_rate, stats))
+    print(f"Fake geocoder on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    print(f"Served {stats['requests']} requests ({stats['throttled']} throttled)")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
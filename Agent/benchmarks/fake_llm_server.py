@@ -0,0 +1,91 @@
+"""Local Groq-compatible chat endpoint backed by `FakeChatModel`.
+
+Lets the real `ChatGroq` clients in shared.py, and so the tiered routing in
+`query_llm`, run end to end without Groq:
+
+    python -m benchmarks.fake_llm_server --port 8089 \
+        --model llama-3.1-8b-instant=0.2 --model llama-3.3-70b-versatile=0.0
+
+    LLM_BASE_URL=http://localhost:8089 GROQ_API_KEY=fake uvicorn main:app
+
+Each `--model NAME=ERROR_RATE` sets how often that model answers with a value
+that is not in the table; unknown models answer correctly.
+"""
+
+import argparse
+import json
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict
+
+from benchmarks.fakes import FakeChatModel
+
+
+def make_handler(models: Dict[str, FakeChatModel], latency_ms: float, jitter_ms: float):
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            if not self.path.rstrip("/").endswith("/chat/completions"):
+                self.send_error(404)
+                return
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            name = body.get("model", "fake-chat")
+            if name not in models:
+                models[name] = FakeChatModel(latency_ms=latency_ms, jitter_ms=jitter_ms, model_name=name)
+            prompt = "\n".join(str(m.get("content", "")) for m in body.get("messages", []))
+            message = models[name].invoke(prompt)
+            usage = message.usage_metadata
+            payload = json.dumps({
+                "id": f"chatcmpl-{uuid.uuid4().hex}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": name,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": message.content},
+                    "finish_reason": "stop",
+                }],
+                "usage": {
+                    "prompt_tokens": usage["input_tokens"],
+                    "completion_tokens": usage["output_tokens"],
+                    "total_tokens": usage["total_tokens"],
+                },
+            }).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Fake Groq-compatible chat completions server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--model", action="append", default=[], metavar="NAME=ERROR_RATE",
+                        help="Per-model share of wrong answers (repeatable)")
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    args = parser.parse_args()
+
+    models: Dict[str, FakeChatModel] = {}
+    for spec in args.model:
+        name, _, rate = spec.partition("=")
+        models[name] = FakeChatModel(args.latency_ms, args.jitter_ms, error_rate=float(rate or 0), model_name=name)
+
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(models, args.latency_ms, args.jitter_ms))
+    print(f"Fake LLM endpoint on http://{args.host}:{args.port} (models: {', '.join(models) or 'any'})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
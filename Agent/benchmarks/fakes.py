@@ -0,0 +1,121 @@
+"""Offline stand-ins for the network-bound pieces of the pipeline.
+
+- `FakeEmbeddings`: hashed character-trigram vectors instead of mpnet.
+- `InMemoryVectorStore`: numpy cosine search plus keyword fill, mirroring the
+  vector + BM25 merge in `WeaviateV3VectorStore.similarity_search`.
+- `FakeChatModel`: answers the Agent2 prompt by reading the table it was given,
+  with optional simulated latency and wrong answers, in place of `ChatGroq`.
+  `benchmarks/fake_llm_server.py` serves it over a Groq-compatible HTTP API.
+"""
+
+import hashlib
+import json
+import re
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+import numpy as np
+
+
+@dataclass
+class FakeDocument:
+    page_content: str
+    metadata: Dict = field(default_factory=dict)
+
+
+@dataclass
+class FakeMessage:
+    content: str
+    usage_metadata: Dict = field(default_factory=dict)
+
+
+class FakeEmbeddings:
+    def __init__(self, dim: int = 256):
+        self.dim = dim
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(t).tolist() for t in texts]
+
+    def _embed(self, text: str) -> np.ndarray:
+        vec = np.zeros(self.dim, dtype=np.float32)
+        padded = f"  {text.lower()} "
+        for i in range(len(padded) - 2):
+            digest = hashlib.blake2b(padded[i:i + 3].encode("utf-8"), digest_size=4).digest()
+            vec[int.from_bytes(digest, "little") % self.dim] += 1.0
+        norm = np.linalg.norm(vec)
+        return vec / norm if norm else vec
+
+
+class InMemoryVectorStore:
+    """Drop-in for the Weaviate stores' `similarity_search(query, k)` contract."""
+
+    def __init__(self, texts: List[str], embedding: Optional[FakeEmbeddings] = None):
+        self.embedding = embedding or FakeEmbeddings()
+        self.texts = list(texts)
+        self.matrix = np.array(self.embedding.embed_documents(self.texts), dtype=np.float32)
+        self.tokens = [set(t.lower().split()) for t in self.texts]
+
+    def similarity_search(self, query: str, k: int = 5) -> List[FakeDocument]:
+        if not self.texts:
+            return []
+        scores = self.matrix @ np.asarray(self.embedding.embed_query(query), dtype=np.float32)
+        top = np.argsort(-scores)[:k].tolist()
+
+        # Keyword fill, like the BM25 half of the Weaviate merge.
+        terms = set(query.lower().split())
+        seen = set(top)
+        for i, toks in enumerate(self.tokens):
+            if len(top) >= k:
+                break
+            if i not in seen and terms & toks:
+                top.append(i)
+                seen.add(i)
+        return [FakeDocument(page_content=self.texts[i], metadata={"row": i}) for i in top[:k]]
+
+
+class FakeChatModel:
+    """Deterministic replacement for `ChatGroq` that understands the Agent2 prompt."""
+
+    _COLUMNS = {"High": 0, "Medium": 1, "Low": 2, "Seasonal Surface": 3, "Seasonal": 3}
+
+    def __init__(self, latency_ms: float = 0.0, jitter_ms: float = 0.0, error_rate: float = 0.0,
+                 model_name: str = "fake-chat"):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        # Share of prompts answered with a value that is not in the table,
+        # to exercise validation and escalation in `shared.query_llm`.
+        self.error_rate = error_rate
+        self.model_name = model_name
+        self.calls = 0
+
+    def invoke(self, prompt: str) -> FakeMessage:
+        self.calls += 1
+        community_id = (re.findall(r'community_id = "([^"]*)"', prompt) or [""])[-1]
+        subsidy_level = (re.findall(r'subsidy_level = "([^"]*)"', prompt) or [""])[-1]
+        table = prompt.rsplit("Table:", 1)[-1]
+
+        value = "Not found"
+        col = self._COLUMNS.get(subsidy_level)
+        for line in table.splitlines():
+            parts = line.split()
+            if col is not None and community_id in parts and len(parts) >= 4:
+                value = parts[-4:][col]
+                break
+
+        # Stable pseudo-random draws per prompt keep runs reproducible.
+        digest = hashlib.blake2b(f"{self.model_name}:{prompt}".encode("utf-8"), digest_size=2).digest()
+        if digest[1] / 256 < self.error_rate:
+            value = "Not found" if digest[1] % 2 else "99.99"
+        if self.latency_ms or self.jitter_ms:
+            time.sleep((self.latency_ms + digest[0] / 255 * self.jitter_ms) / 1000)
+
+        content = json.dumps({"community_id": community_id, "discount_per_kg": value})
+        tokens_in = len(prompt) // 4
+        return FakeMessage(
+            content=content,
+            usage_metadata={"input_tokens": tokens_in, "output_tokens": 20, "total_tokens": tokens_in + 20},
+        )
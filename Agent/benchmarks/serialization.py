@@ -0,0 +1,129 @@
+"""Bytes through Redis and (de)serialization time for cart tasks.
+
+Compares the old setup (JSON, one dict per item) against msgpack with and
+without the columnar cart result, for the two payloads every cart sends:
+
+- task:   the `process_products_task` message body. The Redis broker
+          transport base64-encodes bodies, so broker bytes are reported.
+- result: the result-backend entry holding the cart result.
+
+Run from the Agent directory:
+
+    python -m benchmarks.serialization --cart-sizes 10,100,1000
+"""
+
+import argparse
+import base64
+import json
+import random
+import statistics
+import time
+import uuid
+from typing import Callable, Dict, List
+
+import serialization
+from benchmarks.synthetic import generate_catalog, generate_queries
+
+
+def _task_body(cart_id: str, community_id: str, names: List[str]) -> list:
+    # Celery protocol 2 body: (args, kwargs, embed)
+    product_names = [{f"item{i}": name} for i, name in enumerate(names)]
+    return [[cart_id, community_id, product_names], {}, {"callbacks": None, "errbacks": None, "chain": None, "chord": None}]
+
+
+def _cart_result(cart_id: str, community_id: str, names: List[str], catalog, rng: random.Random) -> Dict:
+    products = []
+    for i, name in enumerate(names):
+        _, code = rng.choice(catalog)
+        matched = rng.random() < 0.9
+        products.append({
+            "product_name": name,
+            "product_code": code if matched else None,
+            "subsidy_level": rng.choice(["Level 1", "Level 2", "Level 3"]) if matched else None,
+            "community_id": community_id,
+            "discount_per_kg": round(rng.uniform(0.1, 8.0), 2) if matched else None,
+            "cart_item_id": f"item{i}",
+            "cache": rng.choice(["local", "redis", "miss"]),
+        })
+    return {"cart_id": cart_id, "products": products}
+
+
+def _result_meta(task_id: str, result: Dict) -> Dict:
+    return {
+        "status": "SUCCESS",
+        "result": result,
+        "traceback": None,
+        "children": [],
+        "date_done": "2026-01-01T00:00:00.000000",
+        "task_id": task_id,
+    }
+
+
+def _json_dumps(obj) -> bytes:
+    return json.dumps(obj).encode()
+
+
+def _time_roundtrip(dumps: Callable, loads: Callable, obj, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        loads(dumps(obj))
+        samples.append((time.perf_counter() - t0) * 1e6)
+    return statistics.median(samples)
+
+
+CODECS = {
+    "json": (_json_dumps, json.loads),
+    "msgpack-z": (serialization.dumps, serialization.loads),
+}
+VARIANTS = [("json", False), ("msgpack-z", False), ("msgpack-z", True)]
+
+
+def run(cart_sizes: List[int], repeat: int, seed: int) -> List[Dict]:
+    rng = random.Random(seed)
+    catalog = generate_catalog(max(cart_sizes) * 10, seed=seed)
+    rows = []
+    for size in cart_sizes:
+        names = generate_queries(catalog, size, seed=seed + size)
+        cart_id, community_id, task_id = str(uuid.uuid4()), "NU-KIV-Arviat", str(uuid.uuid4())
+        body = _task_body(cart_id, community_id, names)
+        result = _cart_result(cart_id, community_id, names, catalog, rng)
+        for codec, columnar in VARIANTS:
+            dumps, loads = CODECS[codec]
+            meta = _result_meta(task_id, serialization.to_columnar(result) if columnar else result)
+            task_bytes = dumps(body)
+            rows.append({
+                "cart_size": size,
+                "variant": f"{codec}{'+columnar' if columnar else ''}",
+                "broker_bytes": len(base64.b64encode(task_bytes)),
+                "result_bytes": len(dumps(meta)),
+                "task_us": _time_roundtrip(dumps, loads, body, repeat),
+                "result_us": _time_roundtrip(dumps, loads, meta, repeat),
+            })
+    return rows
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Celery payload size and serialization time, before and after")
+    parser.add_argument("--cart-sizes", default="10,100,1000")
+    parser.add_argument("--repeat", type=int, default=200, help="Round trips timed per payload (median reported)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rows = run([int(s) for s in args.cart_sizes.split(",") if s], args.repeat, args.seed)
+    header = f"{'cart':>6}  {'variant':<20}{'broker B':>10}{'result B':>10}{'task us':>10}{'result us':>11}"
+    print(header)
+    print("-" * len(header))
+    baseline = {}
+    for r in rows:
+        base = baseline.setdefault(r["cart_size"], r)
+        change = (r["broker_bytes"] + r["result_bytes"]) / (base["broker_bytes"] + base["result_bytes"]) - 1
+        print(
+            f"{r['cart_size']:>6}  {r['variant']:<20}{r['broker_bytes']:>10}{r['result_bytes']:>10}"
+            f"{r['task_us']:>10.1f}{r['result_us']:>11.1f}   {change:+.0%} bytes vs json"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,122 @@
+"""Keystroke-rate load test for product autocomplete.
+
+Every query is replayed one character at a time ("m", "mi", "mil", ...), the
+way a typeahead box calls the API.
+
+Offline (default): drives `SuggestIndex` directly over a synthetic catalog.
+
+    python -m benchmarks.suggest_load --catalog-size 100000 --users 200
+
+Against a running API (`uvicorn main:app`), with concurrent simulated users
+typing at `--keystroke-ms` intervals:
+
+    python -m benchmarks.suggest_load --url http://localhost:8000 --users 50 --concurrency 16
+
+The target is single-digit-millisecond p99 for the offline index.
+"""
+
+import argparse
+import random
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+
+from benchmarks.synthetic import generate_catalog, generate_queries
+
+
+def _percentile(samples: List[float], pct: float) -> float:
+    ordered = sorted(samples)
+    idx = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[idx]
+
+
+def keystrokes(query: str) -> List[str]:
+    return [query[:i] for i in range(1, len(query) + 1) if query[:i].strip()]
+
+
+def _report(label: str, samples: List[float], elapsed: float, errors: int = 0) -> None:
+    print(
+        f"{label}: {len(samples)} requests in {elapsed:.2f}s ({len(samples) / elapsed:.0f}/s), errors={errors}\n"
+        f"  mean={statistics.fmean(samples):.2f}ms p50={_percentile(samples, 50):.2f}ms "
+        f"p95={_percentile(samples, 95):.2f}ms p99={_percentile(samples, 99):.2f}ms max={max(samples):.2f}ms"
+    )
+
+
+def run_offline(args, queries: List[str], rows) -> None:
+    from catalog_snapshot import build_snapshot
+    from suggest_index import SuggestIndex
+
+    t0 = time.perf_counter()
+    index = SuggestIndex(build_snapshot(rows, version="synthetic"))
+    print(f"Index built over {len(rows)} rows in {time.perf_counter() - t0:.2f}s")
+
+    for q in queries[:20]:  # warm up numpy/rapidfuzz code paths
+        index.suggest_rows(q, top_k=args.limit)
+
+    samples: List[float] = []
+    started = time.perf_counter()
+    for query in queries:
+        for prefix in keystrokes(query):
+            t = time.perf_counter()
+            index.suggest_rows(prefix, top_k=args.limit)
+            samples.append((time.perf_counter() - t) * 1000)
+    _report("offline index", samples, time.perf_counter() - started)
+
+
+def run_http(args, queries: List[str]) -> None:
+    import httpx
+
+    samples: List[float] = []
+    errors = 0
+    lock = threading.Lock()
+    client = httpx.Client(base_url=args.url, timeout=5.0, limits=httpx.Limits(max_connections=args.concurrency))
+
+    def user(query: str) -> None:
+        nonlocal errors
+        for prefix in keystrokes(query):
+            t = time.perf_counter()
+            try:
+                resp = client.get("/products/suggest", params={"q": prefix, "limit": args.limit})
+                ok = resp.status_code == 200
+            except httpx.HTTPError:
+                ok = False
+            elapsed = (time.perf_counter() - t) * 1000
+            with lock:
+                samples.append(elapsed)
+                errors += 0 if ok else 1
+            time.sleep(max(0.0, args.keystroke_ms / 1000 - elapsed / 1000))
+
+    client.get("/products/suggest", params={"q": "a"})  # first call builds the index
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        list(pool.map(user, queries))
+    _report(f"http {args.url}", samples, time.perf_counter() - started, errors)
+    client.close()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Keystroke-rate load test for /products/suggest")
+    parser.add_argument("--url", help="Base URL of a running API; omit to test the index offline")
+    parser.add_argument("--catalog-size", type=int, default=100000)
+    parser.add_argument("--users", type=int, default=200, help="Number of simulated typed queries")
+    parser.add_argument("--concurrency", type=int, default=16, help="Concurrent users (HTTP mode)")
+    parser.add_argument("--keystroke-ms", type=float, default=120.0, help="Typing interval (HTTP mode)")
+    parser.add_argument("--limit", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rows = generate_catalog(args.catalog_size, seed=args.seed)
+    queries = [q.lower() for q in generate_queries(rows, args.users, seed=args.seed + 1)]
+    random.Random(args.seed).shuffle(queries)
+
+    if args.url:
+        run_http(args, queries)
+    else:
+        run_offline(args, queries, rows)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,279 @@
+"""Offline benchmark suite for the matcher, retrieval and cart pipeline.
+
+Runs without Postgres, Weaviate, Groq or the embedding model: the catalog is
+synthetic, retrieval uses `InMemoryVectorStore` and the LLM is
+`FakeChatModel`. Each stage runs in a fresh spawned process so its peak RSS
+is measured in isolation.
+
+Stages:
+- matcher:   `ProductDetailAgent.extract_product_details` per query
+- matcher_cached: the same queries again once match_cache has seen them
+  (local tier only), i.e. the cost of a repeated string
+- retrieval: `Agent2(...).context`, i.e. `get_relevant_context`
+- pipeline:  one cart per sample through `tasks._process_single`, with the
+             fast and large LLM tiers both faked (see --llm-fast-error-rate)
+
+The match cache is off in every stage but matcher_cached, so the others keep
+measuring the matcher itself; Redis is never contacted.
+
+Run from the Agent directory:
+
+    python -m benchmarks.suite --sizes 1000,10000,100000 --output bench.json
+    python -m benchmarks.suite --sizes 1000,10000,100000 --compare bench.json
+
+With `--compare`, the run exits 1 if any stage's p95 latency or throughput
+regressed by more than `--threshold` (default 10%) against the baseline file.
+"""
+
+import argparse
+import json
+import multiprocessing
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import time
+from typing import Callable, Dict, List, Optional
+
+STAGES = ["matcher", "matcher_cached", "retrieval", "pipeline"]
+
+
+def _percentile(samples: List[float], pct: float) -> float:
+    ordered = sorted(samples)
+    idx = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[idx]
+
+
+def _peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is KiB on Linux and bytes on macOS.
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def _measure(fn: Callable, inputs: List, units_per_call: int = 1) -> Dict[str, float]:
+    samples: List[float] = []
+    started = time.perf_counter()
+    for item in inputs:
+        t0 = time.perf_counter()
+        fn(item)
+        samples.append((time.perf_counter() - t0) * 1000)
+    elapsed = time.perf_counter() - started
+    return {
+        "samples": len(samples),
+        "mean_ms": statistics.fmean(samples),
+        "p50_ms": _percentile(samples, 50),
+        "p95_ms": _percentile(samples, 95),
+        "p99_ms": _percentile(samples, 99),
+        "throughput_per_s": len(samples) * units_per_call / elapsed if elapsed else 0.0,
+    }
+
+
+def _build_agent1(catalog_size: int, seed: int):
+    from agent1_module import ProductDetailAgent
+    from catalog_snapshot import build_snapshot
+    from benchmarks.synthetic import generate_catalog
+
+    rows = generate_catalog(catalog_size, seed=seed)
+    t0 = time.perf_counter()
+    agent = ProductDetailAgent.from_catalog(build_snapshot(rows, version=f"synthetic-{catalog_size}"))
+    return agent, rows, time.perf_counter() - t0
+
+
+def _build_store(communities: int, seed: int):
+    from benchmarks.fakes import InMemoryVectorStore
+    from benchmarks.synthetic import generate_communities, generate_subsidy_table
+
+    pairs = generate_communities(communities, seed=seed)
+    return InMemoryVectorStore(generate_subsidy_table(pairs, seed=seed)), [cid for _, cid in pairs]
+
+
+def run_stage(stage: str, catalog_size: int, opts: Dict) -> Dict:
+    """Run one stage in the current process and return its result row."""
+    import match_cache
+    import tiered_cache
+    from benchmarks.fakes import FakeChatModel
+    from benchmarks.synthetic import generate_queries
+
+    tiered_cache.AGENT_CACHE_REDIS_URL = ""
+    match_cache.MATCH_CACHE_ENABLED = stage == "matcher_cached"
+    seed = opts["seed"]
+    setup_s = 0.0
+    if stage in ("matcher", "matcher_cached"):
+        agent1, rows, setup_s = _build_agent1(catalog_size, seed)
+        queries = generate_queries(rows, opts["queries"], seed=seed + 1)
+        if stage == "matcher_cached":
+            t0 = time.perf_counter()
+            for query in queries:
+                agent1.extract_product_details(query)
+            setup_s += time.perf_counter() - t0
+        stats = _measure(agent1.extract_product_details, queries)
+    elif stage == "retrieval":
+        from Agent2 import Agent2
+
+        t0 = time.perf_counter()
+        store, community_ids = _build_store(opts["communities"], seed)
+        setup_s = time.perf_counter() - t0
+        targets = [community_ids[i % len(community_ids)] for i in range(opts["queries"])]
+        stats = _measure(lambda cid: Agent2(cid, store=store).context, targets)
+    elif stage == "pipeline":
+        import shared
+        from Agent2 import Agent2
+        from tasks import _process_single
+
+        import llm_budget
+
+        # Large tier answers correctly; the fast tier is wrong `fast_error_rate` of the time.
+        shared.llm = FakeChatModel(latency_ms=opts["llm_latency_ms"], jitter_ms=opts["llm_jitter_ms"],
+                                   model_name="fake-large")
+        shared.fast_llm = FakeChatModel(latency_ms=opts["llm_fast_latency_ms"], jitter_ms=opts["llm_jitter_ms"],
+                                        error_rate=opts["llm_fast_error_rate"], model_name="fake-fast")
+        llm_budget.LLM_BUDGET_PER_MINUTE = 0  # the fake model has no rate limit to share
+        agent1, rows, setup_s = _build_agent1(catalog_size, seed)
+        store, community_ids = _build_store(opts["communities"], seed)
+        queries = generate_queries(rows, opts["carts"] * opts["cart_size"], seed=seed + 1)
+        size = opts["cart_size"]
+        carts = [
+            (community_ids[i % len(community_ids)], queries[i * size:(i + 1) * size])
+            for i in range(opts["carts"])
+        ]
+
+        def run_cart(cart):
+            community_id, names = cart
+            agent2 = Agent2(community_id, store=store)
+            return [
+                _process_single(agent1, agent2, community_id, f"item{j}", name)
+                for j, name in enumerate(names)
+            ]
+
+        stats = _measure(run_cart, carts, units_per_call=size)
+        if shared.fast_llm.calls:
+            stats["llm_escalation_rate"] = shared.llm.calls / shared.fast_llm.calls
+    else:
+        raise ValueError(f"Unknown stage: {stage}")
+
+    return {
+        "stage": stage,
+        "catalog_size": catalog_size,
+        **stats,
+        "setup_s": setup_s,
+        "peak_rss_mb": _peak_rss_mb(),
+    }
+
+
+def _run_isolated(stage: str, catalog_size: int, opts: Dict) -> Dict:
+    ctx = multiprocessing.get_context("spawn")
+    with ctx.Pool(1) as pool:
+        return pool.apply(run_stage, (stage, catalog_size, opts))
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True)
+        return out.stdout.strip()
+    except Exception:
+        return None
+
+
+def compare(current: Dict, baseline: Dict, threshold: float) -> List[str]:
+    """Return human-readable regressions of `current` against `baseline`."""
+    base_rows = {(r["stage"], r["catalog_size"]): r for r in baseline.get("results", [])}
+    regressions = []
+    for row in current["results"]:
+        base = base_rows.get((row["stage"], row["catalog_size"]))
+        if base is None:
+            continue
+        label = f"{row['stage']}@{row['catalog_size']}"
+        if base["p95_ms"] and row["p95_ms"] > base["p95_ms"] * (1 + threshold):
+            regressions.append(f"{label}: p95 {base['p95_ms']:.2f}ms -> {row['p95_ms']:.2f}ms")
+        if base["throughput_per_s"] and row["throughput_per_s"] < base["throughput_per_s"] * (1 - threshold):
+            regressions.append(
+                f"{label}: throughput {base['throughput_per_s']:.1f}/s -> {row['throughput_per_s']:.1f}/s"
+            )
+    return regressions
+
+
+def _print_table(results: List[Dict]) -> None:
+    header = f"{'stage':<16}{'catalog':>9}{'n':>6}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'thru/s':>10}{'rss MB':>9}"
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        print(
+            f"{r['stage']:<16}{r['catalog_size']:>9}{r['samples']:>6}{r['p50_ms']:>10.2f}{r['p95_ms']:>10.2f}"
+            f"{r['p99_ms']:>10.2f}{r['throughput_per_s']:>10.1f}{r['peak_rss_mb']:>9.1f}"
+        )
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Offline benchmarks for matcher, retrieval and cart pipeline")
+    parser.add_argument("--sizes", default="1000,10000,100000", help="Comma-separated catalog sizes (up to 1000000)")
+    parser.add_argument("--stages", default=",".join(STAGES), help=f"Comma-separated subset of {STAGES}")
+    parser.add_argument("--queries", type=int, default=200, help="Queries per matcher/retrieval run")
+    parser.add_argument("--communities", type=int, default=500)
+    parser.add_argument("--carts", type=int, default=20)
+    parser.add_argument("--cart-size", type=int, default=10)
+    parser.add_argument("--llm-latency-ms", type=float, default=0.0, help="Simulated LLM latency per call")
+    parser.add_argument("--llm-jitter-ms", type=float, default=0.0)
+    parser.add_argument("--llm-fast-latency-ms", type=float, default=0.0, help="Simulated fast-tier LLM latency")
+    parser.add_argument("--llm-fast-error-rate", type=float, default=0.0,
+                        help="Share of fast-tier answers that fail validation and escalate")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write results JSON here")
+    parser.add_argument("--compare", help="Baseline results JSON to check for regressions")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Allowed relative regression")
+    parser.add_argument("--in-process", action="store_true", help="Skip per-stage subprocesses (RSS not isolated)")
+    args = parser.parse_args()
+
+    opts = {
+        "seed": args.seed,
+        "queries": args.queries,
+        "communities": args.communities,
+        "carts": args.carts,
+        "cart_size": args.cart_size,
+        "llm_latency_ms": args.llm_latency_ms,
+        "llm_jitter_ms": args.llm_jitter_ms,
+        "llm_fast_latency_ms": args.llm_fast_latency_ms,
+        "llm_fast_error_rate": args.llm_fast_error_rate,
+    }
+    sizes = [int(s) for s in args.sizes.split(",") if s]
+    stages = [s for s in args.stages.split(",") if s]
+    runner = run_stage if args.in_process else _run_isolated
+
+    results = []
+    for stage in stages:
+        # Retrieval does not depend on the catalog, so run it once.
+        for size in (sizes[:1] if stage == "retrieval" else sizes):
+            results.append(runner(stage, size, opts))
+
+    report = {
+        "meta": {
+            "git_revision": _git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "options": opts,
+        },
+        "results": results,
+    }
+    _print_table(results)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Wrote {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.threshold)
+        if regressions:
+            print("Regressions:")
+            for line in regressions:
+                print(f"  {line}")
+            return 1
+        print(f"No regressions beyond {args.threshold:.0%} against {args.compare}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,93 @@
+"""Deterministic synthetic data for the offline benchmarks.
+
+Everything is derived from a seeded `random.Random`, so two runs with the same
+arguments produce byte-identical catalogs, queries and subsidy tables.
+"""
+
+import random
+from typing import List, Tuple
+
+_BRANDS = ["Northern", "Arctic", "Maple", "Boreal", "Tundra", "Polar", "Harbour", "Prairie", "Glacier", "Cedar"]
+_PRODUCTS = [
+    "Milk", "White Bread", "Whole Wheat Bread", "Butter", "Cheddar Cheese", "Eggs", "Flour", "Sugar",
+    "Rolled Oats", "Rice", "Pasta", "Apples", "Bananas", "Oranges", "Potatoes", "Carrots", "Onions",
+    "Ground Beef", "Chicken Breast", "Pork Chops", "Salmon Fillet", "Yogurt", "Infant Formula", "Lard",
+    "Canned Tomatoes", "Peanut Butter", "Frozen Peas", "Char", "Caribou", "Bannock Mix",
+]
+_VARIANTS = ["", "2%", "Homogenized", "Organic", "Lean", "Large", "Unsalted", "Low Fat", "Frozen", "Fresh"]
+_SIZES = ["1L", "2L", "4L", "500g", "1kg", "2kg", "5kg", "10kg", "12 pack", "675g"]
+# Leading digits map to subsidy levels in catalog_snapshot.SUBSIDY_BY_PREFIX; "9" has none.
+_PREFIXES = ["7", "1", "2", "3", "4", "5", "8", "9"]
+_REGIONS = ["ON-NON", "MB-NMB", "AB-NAB", "QC-NQC", "NU-KIV", "NT-INU", "YT-NYT", "SK-NSK", "NL-LAB", "BC-NBC"]
+
+
+def generate_catalog(size: int, seed: int = 0) -> List[Tuple[str, str]]:
+    """Return `size` unique `(itemname, nnc_id)` rows."""
+    rng = random.Random(seed)
+    rows: List[Tuple[str, str]] = []
+    seen = set()
+    serial = 0
+    while len(rows) < size:
+        parts = [rng.choice(_BRANDS), rng.choice(_VARIANTS), rng.choice(_PRODUCTS), rng.choice(_SIZES)]
+        name = " ".join(p for p in parts if p)
+        if name in seen:
+            name = f"{name} #{serial}"
+        seen.add(name)
+        rows.append((name, f"{rng.choice(_PREFIXES)}-{serial:07d}"))
+        serial += 1
+    return rows
+
+
+def _typo(rng: random.Random, text: str) -> str:
+    if len(text) < 4:
+        return text
+    i = rng.randrange(1, len(text) - 1)
+    op = rng.randrange(3)
+    if op == 0:
+        return text[:i] + text[i + 1:]
+    if op == 1:
+        return text[:i] + text[i + 1] + text[i] + text[i + 2:]
+    return text[:i] + rng.choice("abcdefghijklmnopqrstuvwxyz") + text[i:]
+
+
+def generate_queries(catalog: List[Tuple[str, str]], count: int, seed: int = 1) -> List[str]:
+    """Mix of exact names, reformatted names, typos and misses, like real carts."""
+    rng = random.Random(seed)
+    queries: List[str] = []
+    for _ in range(count):
+        name = rng.choice(catalog)[0]
+        kind = rng.random()
+        if kind < 0.4:
+            queries.append(name)
+        elif kind < 0.6:
+            queries.append(name.lower().replace(" ", "  "))
+        elif kind < 0.9:
+            queries.append(_typo(rng, name))
+        else:
+            queries.append(f"unlisted item {rng.randrange(10 ** 6)}")
+    return queries
+
+
+def generate_communities(count: int, seed: int = 2) -> List[Tuple[str, str]]:
+    """Return `(community_name, community_id)` pairs."""
+    rng = random.Random(seed)
+    out = []
+    for i in range(count):
+        region = _REGIONS[i % len(_REGIONS)]
+        out.append((f"Community {i}", f"{region}-{i:03d}"))
+    rng.shuffle(out)
+    return out
+
+
+def generate_subsidy_table(communities: List[Tuple[str, str]], seed: int = 3) -> List[str]:
+    """One text row per community in the layout the Agent2 prompt expects:
+    `Community Name Community ID High Medium Low Seasonal`."""
+    rng = random.Random(seed)
+    lines = []
+    for name, community_id in communities:
+        high = round(rng.uniform(2.5, 16.0), 2)
+        medium = round(high * rng.uniform(0.6, 0.9), 2)
+        low = round(medium * rng.uniform(0.3, 0.6), 2)
+        seasonal = round(low * rng.uniform(0.5, 0.9), 2)
+        lines.append(f"{name} {community_id} {high:.2f} {medium:.2f} {low:.2f} {seasonal:.2f}")
+    return lines
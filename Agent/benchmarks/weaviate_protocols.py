@@ -0,0 +1,93 @@
+"""Compare the v3 GraphQL and v4 gRPC query paths against a live Weaviate.
+
+Start the local container first (`docker compose up weaviate` from Agent/),
+ingest some data with `python vector.py`, then run from the Agent directory:
+
+    python -m benchmarks.weaviate_protocols --iterations 200 ON-NON-ATT MB-NMB-BRO
+
+Both stores run the same `similarity_search` (near-vector + BM25 merge) for
+each query. Query embeddings are computed once up front so the numbers only
+reflect transport, serialization and Weaviate time.
+"""
+
+import argparse
+import statistics
+import time
+from typing import Dict, List
+
+import shared
+
+
+class _CachedEmbedding:
+    """Wrap an embedding model so each query string is embedded only once."""
+
+    def __init__(self, inner):
+        self._inner = inner
+        self._cache: Dict[str, List[float]] = {}
+
+    def embed_query(self, text: str) -> List[float]:
+        if text not in self._cache:
+            self._cache[text] = self._inner.embed_query(text)
+        return self._cache[text]
+
+
+def _percentile(samples: List[float], pct: float) -> float:
+    ordered = sorted(samples)
+    idx = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[idx]
+
+
+def run_protocol(protocol: str, queries: List[str], iterations: int, k: int, warmup: int) -> Dict[str, float]:
+    store = shared.build_vectorstore(protocol)
+    store.embedding = _CachedEmbedding(shared.embedding_model)
+
+    for query in queries:
+        store.embedding.embed_query(query)
+    for _ in range(warmup):
+        for query in queries:
+            store.similarity_search(query, k=k)
+
+    samples: List[float] = []
+    docs = 0
+    started = time.perf_counter()
+    for _ in range(iterations):
+        for query in queries:
+            t0 = time.perf_counter()
+            docs += len(store.similarity_search(query, k=k))
+            samples.append((time.perf_counter() - t0) * 1000)
+    elapsed = time.perf_counter() - started
+
+    return {
+        "protocol": protocol,
+        "calls": len(samples),
+        "docs_per_call": docs / max(1, len(samples)),
+        "mean_ms": statistics.fmean(samples),
+        "p50_ms": _percentile(samples, 50),
+        "p95_ms": _percentile(samples, 95),
+        "p99_ms": _percentile(samples, 99),
+        "qps": len(samples) / elapsed if elapsed else 0.0,
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark Weaviate v3 GraphQL vs v4 gRPC similarity_search")
+    parser.add_argument("queries", nargs="*", default=["ON-NON-ATT", "MB-NMB-BRO", "AB-NAB-FCH"])
+    parser.add_argument("--iterations", type=int, default=100)
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("-k", type=int, default=20, help="Results per query (Agent2 uses 20)")
+    args = parser.parse_args()
+
+    rows = [run_protocol(p, args.queries, args.iterations, args.k, args.warmup) for p in ("graphql", "grpc")]
+    print(f"{'protocol':<10}{'calls':>8}{'docs':>7}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'qps':>10}")
+    for r in rows:
+        print(
+            f"{r['protocol']:<10}{r['calls']:>8}{r['docs_per_call']:>7.1f}{r['mean_ms']:>10.2f}"
+            f"{r['p50_ms']:>10.2f}{r['p95_ms']:>10.2f}{r['p99_ms']:>10.2f}{r['qps']:>10.1f}"
+        )
+    if rows[0]["docs_per_call"] != rows[1]["docs_per_call"]:
+        print("Warning: protocols returned different result counts; check the class contents.")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
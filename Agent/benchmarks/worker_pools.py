@@ -0,0 +1,231 @@
+"""Per-worker memory and throughput of the Celery pool modes.
+
+Models the three ways a worker can run `process_products_task` without a
+broker:
+
+- prefork-cold:    forked children each load their own resources (the old
+                   behaviour, and what every recycled child repeated)
+- prefork-preload: the parent loads once and calls `gc.freeze()`, then
+                   forks; children share the pages copy-on-write
+- threads:         one process, resources loaded once, N task threads
+
+The resources are a synthetic catalog behind `ProductDetailAgent` plus a
+read-only float32 array standing in for the embedding model's weights
+(`--model-mb`, ~420 MB for mpnet), or the real model with `--real-model`.
+Each item runs the real matcher, then sleeps `--io-ms` to stand in for the
+Weaviate and Groq round trips that dominate task time.
+
+Memory is read from /proc/<pid>/smaps_rollup (Linux): PSS splits shared
+pages between the processes using them, so summing PSS across workers gives
+the real footprint; USS is what each worker holds privately.
+
+Run from the Agent directory:
+
+    python -m benchmarks.worker_pools --workers 4 --carts 80 --cart-size 10
+"""
+
+import argparse
+import gc
+import multiprocessing
+import os
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+import numpy as np
+
+MODES = ["prefork-cold", "prefork-preload", "threads"]
+
+_resources = None
+
+
+def _memory_mb(pid: str = "self") -> Dict[str, float]:
+    fields = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 2 and parts[0].endswith(":") and parts[1].isdigit():
+                fields[parts[0][:-1]] = int(parts[1]) / 1024
+    return {
+        "rss_mb": fields.get("Rss", 0.0),
+        "pss_mb": fields.get("Pss", 0.0),
+        "uss_mb": fields.get("Private_Clean", 0.0) + fields.get("Private_Dirty", 0.0),
+    }
+
+
+def load_resources(opts: Dict):
+    """Build the read-only state a worker needs; returns load seconds."""
+    global _resources
+    from agent1_module import ProductDetailAgent
+    from catalog_snapshot import build_snapshot
+    from benchmarks.synthetic import generate_catalog
+
+    started = time.perf_counter()
+    agent = ProductDetailAgent.from_catalog(
+        build_snapshot(generate_catalog(opts["catalog_size"], seed=opts["seed"]), version="synthetic")
+    )
+    agent.catalog.norm_list
+    if opts["real_model"]:
+        import shared
+
+        model = shared.embedding_model.load()
+    else:
+        model = np.random.default_rng(opts["seed"]).random(opts["model_mb"] * 1024 * 1024 // 4, dtype=np.float32)
+    _resources = (agent, model)
+    return time.perf_counter() - started
+
+
+def _run_item(name: str, io_s: float) -> None:
+    agent, _ = _resources
+    agent.extract_product_details(name)
+    time.sleep(io_s)
+
+
+def _child(queue, results, opts: Dict, preloaded: bool) -> None:
+    load_s = 0.0 if preloaded else load_resources(opts)
+    items = 0
+    started = time.perf_counter()
+    while True:
+        cart = queue.get()
+        if cart is None:
+            break
+        for name in cart:
+            _run_item(name, opts["io_ms"] / 1000)
+            items += 1
+    results.put({"pid": os.getpid(), "load_s": load_s, "items": items,
+                 "busy_s": time.perf_counter() - started, **_memory_mb()})
+
+
+def run_prefork(carts: List[List[str]], opts: Dict, preload: bool) -> Dict:
+    ctx = multiprocessing.get_context("fork")
+    parent_load_s = 0.0
+    if preload:
+        parent_load_s = load_resources(opts)
+        gc.collect()
+        gc.freeze()
+
+    queue, results = ctx.Queue(), ctx.Queue()
+    for cart in carts:
+        queue.put(cart)
+    for _ in range(opts["workers"]):
+        queue.put(None)
+
+    started = time.perf_counter()
+    procs = [ctx.Process(target=_child, args=(queue, results, opts, preload)) for _ in range(opts["workers"])]
+    for p in procs:
+        p.start()
+    rows = [results.get() for _ in procs]
+    elapsed = time.perf_counter() - started
+    for p in procs:
+        p.join()
+    if preload:
+        gc.unfreeze()
+
+    return {
+        "workers": len(rows),
+        "items": sum(r["items"] for r in rows),
+        "elapsed_s": elapsed,
+        "load_s": parent_load_s or statistics.fmean(r["load_s"] for r in rows),
+        "rss_mb_per_worker": statistics.fmean(r["rss_mb"] for r in rows),
+        "uss_mb_per_worker": statistics.fmean(r["uss_mb"] for r in rows),
+        "pss_mb_total": sum(r["pss_mb"] for r in rows),
+    }
+
+
+def run_threads(carts: List[List[str]], opts: Dict) -> Dict:
+    load_s = load_resources(opts)
+    io_s = opts["io_ms"] / 1000
+
+    def run_cart(cart):
+        for name in cart:
+            _run_item(name, io_s)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=opts["workers"]) as pool:
+        list(pool.map(run_cart, carts))
+    elapsed = time.perf_counter() - started
+    mem = _memory_mb()
+    return {
+        "workers": opts["workers"],
+        "items": sum(len(c) for c in carts),
+        "elapsed_s": elapsed,
+        "load_s": load_s,
+        "rss_mb_per_worker": mem["rss_mb"] / opts["workers"],
+        "uss_mb_per_worker": mem["uss_mb"] / opts["workers"],
+        "pss_mb_total": mem["pss_mb"],
+    }
+
+
+def run_mode(mode: str, opts: Dict) -> Dict:
+    from benchmarks.synthetic import generate_catalog, generate_queries
+
+    rows = generate_catalog(opts["catalog_size"], seed=opts["seed"])
+    names = generate_queries(rows, opts["carts"] * opts["cart_size"], seed=opts["seed"] + 1)
+    size = opts["cart_size"]
+    carts = [names[i * size:(i + 1) * size] for i in range(opts["carts"])]
+    del rows, names
+
+    if mode == "threads":
+        result = run_threads(carts, opts)
+    else:
+        result = run_prefork(carts, opts, preload=(mode == "prefork-preload"))
+    result["mode"] = mode
+    result["throughput_per_s"] = result["items"] / result["elapsed_s"]
+    return result
+
+
+def _mode_entry(mode: str, opts: Dict, out) -> None:
+    out.put(run_mode(mode, opts))
+
+
+def _run_isolated(mode: str, opts: Dict) -> Dict:
+    # Each mode starts from a fresh interpreter so earlier modes' memory does not leak into it.
+    # A plain Process rather than a Pool: pool workers are daemonic and cannot fork children.
+    ctx = multiprocessing.get_context("spawn")
+    out = ctx.Queue()
+    proc = ctx.Process(target=_mode_entry, args=(mode, opts, out))
+    proc.start()
+    result = out.get()
+    proc.join()
+    return result
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Memory and throughput of prefork (cold/preload) vs thread pools")
+    parser.add_argument("--modes", default=",".join(MODES), help=f"Comma-separated subset of {MODES}")
+    parser.add_argument("--workers", type=int, default=4, help="Pool concurrency")
+    parser.add_argument("--carts", type=int, default=80)
+    parser.add_argument("--cart-size", type=int, default=10)
+    parser.add_argument("--catalog-size", type=int, default=100000)
+    parser.add_argument("--model-mb", type=int, default=420, help="Size of the stand-in model weights")
+    parser.add_argument("--real-model", action="store_true", help="Load the real embedding model instead")
+    parser.add_argument("--io-ms", type=float, default=50.0, help="Simulated Weaviate + Groq wait per item")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    opts = {
+        "workers": args.workers,
+        "carts": args.carts,
+        "cart_size": args.cart_size,
+        "catalog_size": args.catalog_size,
+        "model_mb": args.model_mb,
+        "real_model": args.real_model,
+        "io_ms": args.io_ms,
+        "seed": args.seed,
+    }
+    header = f"{'mode':<17}{'workers':>8}{'items/s':>9}{'load s':>8}{'RSS/wkr':>9}{'USS/wkr':>9}{'PSS total':>11}"
+    print(header)
+    print("-" * len(header))
+    for mode in [m for m in args.modes.split(",") if m]:
+        r = _run_isolated(mode, opts)
+        print(
+            f"{r['mode']:<17}{r['workers']:>8}{r['throughput_per_s']:>9.1f}{r['load_s']:>8.2f}"
+            f"{r['rss_mb_per_worker']:>9.0f}{r['uss_mb_per_worker']:>9.0f}{r['pss_mb_total']:>11.0f}"
+        )
+    print("Memory in MB; PSS total is the pool's real footprint.")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
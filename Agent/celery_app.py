@@ -6,10 +6,44 @@ batch product processing. Configure broker and backend via environment vars.
 Environment variables:
 - CELERY_BROKER_URL (e.g., redis://redis:6379/0)
 - CELERY_RESULT_BACKEND (e.g., redis://redis:6379/1)
+- CELERY_METRICS_PORT (optional; serves worker Prometheus metrics on this port)
+- PROMETHEUS_MULTIPROC_DIR (set with CELERY_METRICS_PORT under the prefork pool)
+- CELERY_SERIALIZER (default msgpack-z, see serialization.py; "json" restores JSON)
+
+Worker pools:
+- CELERY_POOL (default prefork): "threads" runs tasks as threads of one
+  process, which suits these I/O-bound tasks and loads every model once;
+  "gevent" needs gevent installed and `-P gevent` on the command line so
+  it can patch before imports.
+- CELERY_CONCURRENCY (default: Celery's, the CPU count)
+- CELERY_MAX_TASKS_PER_CHILD (default 100; 0 never recycles prefork children)
+- CELERY_PRELOAD (default 1): load the catalog, embedding model and LLM
+  clients in `worker_init` (see worker_resources.preload). Under prefork this
+  runs in the parent, so children share them copy-on-write and recycled
+  children start warm.
+
+Checkout carts go to the "interactive" queue and batch re-pricing to "bulk",
+so a bulk run never sits ahead of a checkout. Run one worker per queue to give
+each its own concurrency, e.g.:
+
+	celery -A celery_app.celery_app worker -Q interactive -c 8
+	celery -A celery_app.celery_app worker -Q bulk -c 2
 """
 
 import os
 from celery import Celery
+from kombu import Queue
+from celery.signals import worker_init, worker_process_shutdown
+from metrics import mark_process_dead, start_worker_exporter
+from serialization import SERIALIZER_NAME, register_serializer
+
+CELERY_SERIALIZER = os.getenv("CELERY_SERIALIZER", SERIALIZER_NAME)
+CELERY_POOL = os.getenv("CELERY_POOL", "prefork")
+CELERY_CONCURRENCY = int(os.getenv("CELERY_CONCURRENCY", "0")) or None
+CELERY_MAX_TASKS_PER_CHILD = int(os.getenv("CELERY_MAX_TASKS_PER_CHILD", "100")) or None
+CELERY_PRELOAD = os.getenv("CELERY_PRELOAD", "1").lower() in {"1", "true", "yes"}
+INTERACTIVE_QUEUE = "interactive"
+BULK_QUEUE = "bulk"
 
 
 def create_celery_app() -> Celery:
@@ -22,18 +56,37 @@ def create_celery_app() -> Celery:
 	# If run from repo root, tasks are "Agent.tasks"; from Agent dir, it's "tasks".
 	tasks_module = "Agent.tasks" if os.path.basename(os.getcwd()) != "Agent" else "tasks"
 
+	serializer = CELERY_SERIALIZER
+	if serializer == SERIALIZER_NAME and not register_serializer():
+		print("ormsgpack is not installed; falling back to JSON task serialization")
+		serializer = "json"
+
 	# Reasonable defaults; can be overridden via CELERY_* env vars
 	app.conf.update(
-		task_serializer="json",
-		result_serializer="json",
-		accept_content=["json"],
+		task_serializer=serializer,
+		result_serializer=serializer,
+		# Keep accepting JSON so messages queued before a switch still decode.
+		accept_content=sorted({"json", serializer}),
+		result_accept_content=sorted({"json", serializer}),
 		task_time_limit=300,
 		task_soft_time_limit=270,
-		worker_max_tasks_per_child=100,
+		worker_pool=CELERY_POOL,
+		worker_max_tasks_per_child=CELERY_MAX_TASKS_PER_CHILD,
+		task_queues=(Queue(INTERACTIVE_QUEUE), Queue(BULK_QUEUE)),
+		task_default_queue=INTERACTIVE_QUEUE,
+		task_routes={
+			"agent.process_products": {"queue": INTERACTIVE_QUEUE},
+			"agent.process_products_bulk": {"queue": BULK_QUEUE},
+		},
+		# Reserve one task at a time so a busy worker does not hold carts another could start.
+		worker_prefetch_multiplier=1,
 		# Ensure tasks module is imported by workers
 		include=[tasks_module],
 	)
 
+	if CELERY_CONCURRENCY:
+		app.conf.worker_concurrency = CELERY_CONCURRENCY
+
 	# Optional eager mode for local testing (runs tasks in-process)
 	eager = os.getenv("CELERY_TASK_ALWAYS_EAGER", "0").lower() in {"1", "true", "yes"}
 	if eager:
@@ -43,3 +96,27 @@ def create_celery_app() -> Celery:
 
 
 celery_app = create_celery_app()
+
+
+@worker_init.connect
+def _start_metrics_exporter(**_kwargs) -> None:
+	port = os.getenv("CELERY_METRICS_PORT")
+	if port:
+		start_worker_exporter(int(port))
+
+
+@worker_init.connect
+def _preload_resources(**_kwargs) -> None:
+	if CELERY_PRELOAD:
+		from worker_resources import preload
+
+		try:
+			preload()
+		except Exception as e:
+			# Children fall back to loading on first use.
+			print(f"Worker preload failed: {e}")
+
+
+@worker_process_shutdown.connect
+def _mark_metrics_process_dead(pid=None, **_kwargs) -> None:
+	mark_process_dead(pid or os.getpid())
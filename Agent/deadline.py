@@ -0,0 +1,74 @@
+"""Request deadlines propagated from /predict down to individual LLM calls.
+
+The API turns each request's timeout into an absolute deadline (epoch seconds,
+so it survives the hop to a Celery worker on another host) and the task runs
+the cart inside `deadline_scope`. Code below reads it from a contextvar:
+
+- `remaining()` is the time left, or None when no deadline is set.
+- `stage_timeout(name)` caps that by the stage's own budget in STAGE_BUDGETS,
+  so one slow call cannot use up the time meant for the rest of the cart.
+  Outside a deadline scope (the Streamlit app, bulk tasks) it is None and
+  stages are unbounded, as before.
+- `check(name)` raises `DeadlineExceeded` once the deadline has passed.
+
+Environment variables:
+- PREDICT_TIMEOUT_SECONDS (default unset: requests without `timeout_seconds`
+  wait for the cart with no deadline, as before deadlines existed)
+- PREDICT_MAX_TIMEOUT_SECONDS (default 300; the largest timeout a request may ask for)
+- DEADLINE_LLM_FAST_SECONDS (default 4)
+- DEADLINE_LLM_LARGE_SECONDS (default 12)
+"""
+
+import contextvars
+import os
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+PREDICT_TIMEOUT_SECONDS = float(os.getenv("PREDICT_TIMEOUT_SECONDS") or 0) or None
+PREDICT_MAX_TIMEOUT_SECONDS = float(os.getenv("PREDICT_MAX_TIMEOUT_SECONDS", "300"))
+
+STAGE_BUDGETS = {
+    "llm_fast": float(os.getenv("DEADLINE_LLM_FAST_SECONDS", "4")),
+    "llm_large": float(os.getenv("DEADLINE_LLM_LARGE_SECONDS", "12")),
+}
+
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("agent_deadline", default=None)
+
+
+class DeadlineExceeded(Exception):
+    """The request's deadline, or a stage's budget, ran out."""
+
+
+@contextmanager
+def deadline_scope(deadline: Optional[float]):
+    """Run the block under absolute `deadline` (epoch seconds); None means no deadline."""
+    token = _deadline.set(deadline)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining() -> Optional[float]:
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.time()
+
+
+def expired() -> bool:
+    left = remaining()
+    return left is not None and left <= 0
+
+
+def stage_timeout(name: str) -> Optional[float]:
+    """Seconds `name` may take: its budget, capped by the time left; None outside a deadline scope."""
+    left = remaining()
+    if left is None:
+        return None
+    budget = STAGE_BUDGETS.get(name)
+    return max(0.0, left if budget is None else min(budget, left))
+
+
+def check(name: str) -> None:
+    if expired():
+        raise DeadlineExceeded(f"Deadline passed before {name}")
@@ -0,0 +1,153 @@
+"""Alias pointers for blue/green Weaviate index rebuilds.
+
+Weaviate 1.25 has no native class aliases, so the pointer lives in a tiny
+`IndexAlias` class: one object per alias, with a deterministic UUID, whose
+`target` property names the versioned class currently serving reads.
+Replacing that single object is atomic, so readers switch from the old class
+to the new one between two queries and never see a partial index.
+
+Versioned classes are named `<alias>_V<version>`, e.g. `ProductChunk_V20261018T120000`.
+If an alias has no pointer yet, it resolves to the class of the same name,
+which keeps deployments that predate blue/green ingestion working.
+
+The pointer object also keeps the alias's `history` of targets, which is the
+order `list_versions` and `garbage_collect` go by: version suffixes are
+arbitrary INGESTION_VERSION strings and do not sort by age.
+"""
+
+import re
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+from weaviate import Client as V3Client  # v3 client
+from weaviate.util import generate_uuid5
+
+ALIAS_CLASS = "IndexAlias"
+ALIAS_HISTORY_LENGTH = 50
+
+
+def alias_uuid(alias: str) -> str:
+    return generate_uuid5(alias, ALIAS_CLASS)
+
+
+def versioned_class_name(alias: str, version: str) -> str:
+    return f"{alias}_V{re.sub(r'[^0-9A-Za-z]', '', version)}"
+
+
+_ALIAS_PROPERTIES = [
+    {"name": "alias", "dataType": ["text"], "tokenization": "field"},
+    {"name": "target", "dataType": ["text"], "tokenization": "field"},
+    {"name": "updated_at", "dataType": ["text"]},
+    {"name": "history", "dataType": ["text[]"], "tokenization": "field"},
+]
+
+
+def _ensure_alias_class(client: V3Client) -> None:
+    schema = client.schema.get()
+    existing = next((c for c in schema.get("classes", []) if c.get("class") == ALIAS_CLASS), None)
+    if existing is None:
+        client.schema.create_class({"class": ALIAS_CLASS, "vectorizer": "none", "properties": _ALIAS_PROPERTIES})
+        return
+    have = {p.get("name") for p in existing.get("properties", [])}
+    for prop in _ALIAS_PROPERTIES:
+        if prop["name"] not in have:
+            client.schema.property.create(ALIAS_CLASS, prop)
+
+
+def _read_alias_props(client: V3Client, alias: str) -> Dict:
+    try:
+        obj = client.data_object.get_by_id(alias_uuid(alias), class_name=ALIAS_CLASS)
+    except Exception:
+        return {}
+    return (obj or {}).get("properties") or {}
+
+
+def read_alias(client: V3Client, alias: str) -> Optional[str]:
+    """Return the class `alias` points to, or None if no pointer exists."""
+    return _read_alias_props(client, alias).get("target") or None
+
+
+def alias_history(client: V3Client, alias: str) -> List[str]:
+    """Targets `alias` has pointed to, oldest first (a class repeats if it was rolled back to)."""
+    props = _read_alias_props(client, alias)
+    history = list(props.get("history") or [])
+    if not history and props.get("target"):
+        history = [props["target"]]  # pointer written before history was kept
+    return history
+
+
+def set_alias(client: V3Client, alias: str, target: str) -> Optional[str]:
+    """Atomically repoint `alias` to `target`; returns the previous target."""
+    _ensure_alias_class(client)
+    previous = read_alias(client, alias)
+    history = alias_history(client, alias)
+    if not history or history[-1] != target:
+        history.append(target)
+    props = {
+        "alias": alias,
+        "target": target,
+        "updated_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "history": history[-ALIAS_HISTORY_LENGTH:],
+    }
+    uuid = alias_uuid(alias)
+    if client.data_object.exists(uuid, class_name=ALIAS_CLASS):
+        client.data_object.replace(props, class_name=ALIAS_CLASS, uuid=uuid)
+    else:
+        client.data_object.create(props, class_name=ALIAS_CLASS, uuid=uuid)
+    return previous
+
+
+def list_versions(client: V3Client, alias: str) -> List[str]:
+    """Versioned classes of `alias`, least recently served first.
+
+    Classes ordered by when the alias last pointed to them; classes it never
+    pointed to (e.g. failed builds) come first, by name.
+    """
+    prefix = f"{alias}_V"
+    schema = client.schema.get()
+    existing = {c["class"] for c in schema.get("classes", []) if c.get("class", "").startswith(prefix)}
+    last_served = {name: i for i, name in enumerate(alias_history(client, alias))}
+    never_served = sorted(name for name in existing if name not in last_served)
+    return never_served + sorted((name for name in existing if name in last_served), key=last_served.get)
+
+
+def garbage_collect(client: V3Client, alias: str, keep: int = 2) -> List[str]:
+    """Drop all but the `keep` most recently served versions, never the current target."""
+    current = read_alias(client, alias)
+    versions = [v for v in list_versions(client, alias) if v != current]
+    # The current target is always kept and counts towards `keep`.
+    stale = versions[:max(0, len(versions) - max(keep - (current is not None), 0))]
+    for class_name in stale:
+        client.schema.delete_class(class_name)
+    return stale
+
+
+class AliasResolver:
+    """Resolve an alias for readers, caching the answer for `ttl` seconds.
+
+    Falls back to the last known target (or the alias itself) when Weaviate
+    cannot be reached, so resolution never adds an outage of its own.
+    """
+
+    def __init__(self, alias: str, client_provider: Callable[[], Optional[V3Client]], ttl: float = 10.0):
+        self.alias = alias
+        self._client_provider = client_provider
+        self.ttl = ttl
+        self._target: Optional[str] = None
+        self._expires = 0.0
+        self._lock = threading.Lock()
+
+    def __call__(self) -> str:
+        if self._target is not None and time.time() < self._expires:
+            return self._target
+        with self._lock:
+            if self._target is None or time.time() >= self._expires:
+                client = self._client_provider()
+                target = read_alias(client, self.alias) if client is not None else None
+                self._target = target or self._target or self.alias
+                self._expires = time.time() + self.ttl
+        return self._target
+
+    def invalidate(self) -> None:
+        self._expires = 0.0
@@ -0,0 +1,152 @@
+"""Groq request budget shared by all workers, with capacity reserved for checkout.
+
+A token bucket in Redis holds up to LLM_BUDGET_PER_MINUTE requests and refills
+continuously at that rate. Interactive calls may drain the bucket; bulk calls
+only take a token while more than LLM_BUDGET_INTERACTIVE_RESERVE of the
+bucket would remain, so a re-pricing run cannot starve checkout carts.
+Interactive calls that still find no token after their wait go ahead anyway
+and are charged with `debit`, which may take the bucket below zero: every
+request that reaches the provider is counted, and bulk work waits until the
+overdraft has refilled.
+
+Groq limits each model separately, so every model gets its own bucket.
+The priority of the current call comes from `priority_scope`, which the
+Celery tasks set around each cart; code outside a scope counts as interactive.
+Refill and take happen in one Lua script using the Redis clock, so workers on
+different hosts share one consistent bucket. If Redis is unavailable the
+budget fails open and calls go straight to the provider.
+
+Environment variables:
+- LLM_BUDGET_PER_MINUTE (default 30; 0 disables the budget)
+- LLM_BUDGET_INTERACTIVE_RESERVE (default 0.3, fraction of the bucket)
+- LLM_BUDGET_INTERACTIVE_WAIT_SECONDS (default 5)
+- LLM_BUDGET_BULK_WAIT_SECONDS (default 120)
+"""
+
+import contextvars
+import os
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+from tiered_cache import KEY_PREFIX, get_redis, mark_redis_down
+
+INTERACTIVE = "interactive"
+BULK = "bulk"
+
+LLM_BUDGET_PER_MINUTE = float(os.getenv("LLM_BUDGET_PER_MINUTE", "30"))
+LLM_BUDGET_INTERACTIVE_RESERVE = float(os.getenv("LLM_BUDGET_INTERACTIVE_RESERVE", "0.3"))
+MAX_WAIT_SECONDS = {
+    INTERACTIVE: float(os.getenv("LLM_BUDGET_INTERACTIVE_WAIT_SECONDS", "5")),
+    BULK: float(os.getenv("LLM_BUDGET_BULK_WAIT_SECONDS", "120")),
+}
+BUDGET_KEY = f"{KEY_PREFIX}:llm_budget"
+
+_priority: contextvars.ContextVar[str] = contextvars.ContextVar("llm_priority", default=INTERACTIVE)
+
+# KEYS[1] bucket; ARGV: capacity, refill per second, cost, floor the bucket must stay at,
+# and 1 to take the tokens regardless of the floor (a debit).
+# Returns {1, 0} when taken, else {0, milliseconds until enough tokens have refilled}.
+_TAKE_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local floor = tonumber(ARGV[4])
+local force = tonumber(ARGV[5]) == 1
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local taken = 0
+if force or tokens - cost >= floor then
+    tokens = tokens - cost
+    taken = 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) * 2)
+if taken == 1 then
+    return {1, 0}
+end
+return {0, math.ceil((floor + cost - tokens) / rate * 1000)}
+"""
+_take_script = None
+
+
+class LLMBudgetExceeded(RuntimeError):
+    """No budget became available within the priority's maximum wait."""
+
+
+def current_priority() -> str:
+    return _priority.get()
+
+
+@contextmanager
+def priority_scope(priority: str):
+    """Attribute LLM calls made inside the block to `priority`."""
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def _try_take(client, cost: float, priority: str, bucket: str, force: bool = False):
+    global _take_script
+    if _take_script is None:
+        _take_script = client.register_script(_TAKE_SCRIPT)
+    capacity = LLM_BUDGET_PER_MINUTE
+    floor = 0.0 if priority == INTERACTIVE else capacity * LLM_BUDGET_INTERACTIVE_RESERVE
+    taken, wait_ms = _take_script(
+        keys=[f"{BUDGET_KEY}:{bucket}"], args=[capacity, capacity / 60.0, cost, floor, int(force)]
+    )
+    return bool(taken), int(wait_ms) / 1000.0
+
+
+def acquire(cost: float = 1.0, priority: Optional[str] = None, bucket: str = "default",
+            max_wait: Optional[float] = None) -> bool:
+    """Wait until `cost` requests of `bucket` are available for `priority`.
+
+    Returns False if none became available within the priority's maximum wait
+    (or `max_wait`, if shorter); True otherwise, including when the budget is
+    disabled or Redis is down.
+    """
+    if LLM_BUDGET_PER_MINUTE <= 0:
+        return True
+    priority = priority or current_priority()
+    wait_limit = MAX_WAIT_SECONDS.get(priority, MAX_WAIT_SECONDS[INTERACTIVE])
+    if max_wait is not None:
+        wait_limit = min(wait_limit, max_wait)
+    deadline = time.monotonic() + wait_limit
+    while True:
+        client = get_redis()
+        if client is None:
+            return True
+        try:
+            taken, wait_s = _try_take(client, cost, priority, bucket)
+        except Exception as e:
+            mark_redis_down(e)
+            return True
+        if taken:
+            return True
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return False
+        time.sleep(min(wait_s, remaining))
+
+
+def debit(cost: float = 1.0, bucket: str = "default") -> None:
+    """Charge `cost` requests of `bucket` without waiting, even below zero.
+
+    For calls that go ahead after `acquire` returned False.
+    """
+    if LLM_BUDGET_PER_MINUTE <= 0:
+        return
+    client = get_redis()
+    if client is None:
+        return
+    try:
+        _try_take(client, cost, INTERACTIVE, bucket, force=True)
+    except Exception as e:
+        mark_redis_down(e)
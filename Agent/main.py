@@ -1,16 +1,35 @@
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel, RootModel
-from typing import List, Dict
+import json
+import time
+from fastapi import FastAPI, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field, RootModel
+from typing import List, Dict, Optional
+from celery.exceptions import TaskRevokedError, TimeoutError as CeleryTimeoutError
 from agent1_module import ProductDetailAgent
 from Agent2 import Agent2
 from tasks import process_products_task
-from validation import validate_and_trigger_agents
+from validation import VALIDATION_BULK_MAX_ITEMS, validate_addresses_bulk, validate_and_trigger_agents
+from shared import get_weaviate_breaker_status
+from metrics import metrics_asgi_app
+from catalog_snapshot import load_catalog
+from suggest_index import RefreshingSuggestIndex
+from serialization import from_columnar
+from deadline import PREDICT_MAX_TIMEOUT_SECONDS, PREDICT_TIMEOUT_SECONDS
 
 app = FastAPI()
+_metrics_app = metrics_asgi_app()
+if _metrics_app is not None:
+    app.mount("/metrics", _metrics_app)
+
+suggest_index = RefreshingSuggestIndex(load_catalog)
+
 class LocationRequest(BaseModel):
     address: str
     community_name: str
 
+class BulkLocationRequest(BaseModel):
+    items: List[LocationRequest]
+
 class ProductItem(RootModel[Dict[str, str]]):
     pass
 
@@ -18,45 +37,30 @@ class PredictionRequest(BaseModel):
     cart_id: str
     community_id: str
     product_names: List[ProductItem]
-
-def format_response(cart_id: str, community_id: str, raw_products: List[dict], cart_item_ids: List[str]) -> dict:
-    formatted_products = []
-    for product, cart_item_id in zip(raw_products, cart_item_ids):
-        # Rename discount_per_kg to subsidy_value if present
-        subsidy_value = product.get("discount_per_kg") or product.get("subsidy_value")
-        formatted_products.append({
-            "product_name": product.get("product_name"),
-            "product_code": product.get("product_code"),
-            "subsidy_level": product.get("subsidy_level"),
-            "community_id": community_id,
-            "subsidy_value": subsidy_value,
-            "cart_item_id": cart_item_id,
-        })
-    return {
-        "cart_id": cart_id,
-        "products": formatted_products
-    }
-
+    # Seconds the caller will wait; defaults to PREDICT_TIMEOUT_SECONDS, and to no deadline if that is unset.
+    timeout_seconds: Optional[float] = Field(None, gt=0, le=PREDICT_MAX_TIMEOUT_SECONDS)
 
 @app.post("/predict")
 def predict(request: PredictionRequest) -> dict:
-    async_result = process_products_task.delay(
-        request.cart_id,
-        request.community_id,
-        [p.dict() for p in request.product_names]  # send full dicts
-    )
-    results = async_result.get()  # wait for worker result
-    return results
+    timeout = request.timeout_seconds or PREDICT_TIMEOUT_SECONDS
+    product_names = [p.dict() for p in request.product_names]  # send full dicts
+    if timeout is None:
+        async_result = process_products_task.delay(request.cart_id, request.community_id, product_names)
+        return from_columnar(async_result.get())  # wait for worker result
 
+    expires_at = time.time() + timeout
+    # The worker stops slightly before the API gives up, so partial results make it back.
+    worker_deadline = expires_at - min(1.0, timeout * 0.1)
+    async_result = process_products_task.apply_async(
+        args=(request.cart_id, request.community_id, product_names),
+        kwargs={"deadline": worker_deadline},
+        expires=timeout,  # never start a cart nobody is waiting for
+    )
     try:
-        results: List[dict] = async_result.get(timeout=300)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Batch processing failed: {e}")
-
-    if not results:
-        raise HTTPException(status_code=404, detail="No valid results generated.")
-
-    return format_response(request.cart_id, request.community_id, results, cart_item_ids)
+        results = async_result.get(timeout=max(0.1, expires_at - time.time()))  # wait for worker result
+    except (CeleryTimeoutError, TaskRevokedError):
+        raise HTTPException(status_code=504, detail="Cart pricing did not finish within the request deadline.")
+    return from_columnar(results)
 
 @app.post("/validate-address/")
 def validate_address_endpoint(payload: LocationRequest):
@@ -75,4 +79,45 @@ def validate_address_endpoint(payload: LocationRequest):
     except HTTPException as http_err:
         raise http_err
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/validate-address/bulk")
+async def validate_addresses_bulk_endpoint(payload: BulkLocationRequest):
+    """Validate many addresses; streams one NDJSON line per item as it resolves.
+
+    Lines arrive in completion order, each with the item's `index` in `items`
+    and the fields `/validate-address/` returns. Failures are per item
+    (`status` "failed" or "error"), never for the whole batch.
+    """
+    if len(payload.items) > VALIDATION_BULK_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"At most {VALIDATION_BULK_MAX_ITEMS} addresses per request.")
+    items = [(item.address, item.community_name) for item in payload.items]
+
+    async def lines():
+        async for result in validate_addresses_bulk(items):
+            yield json.dumps(result) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+@app.get("/health/weaviate")
+def weaviate_health() -> dict:
+    """Report the Weaviate circuit breaker state and trip counts."""
+    return get_weaviate_breaker_status()
+
+
+@app.get("/products/suggest")
+def suggest_products(q: str = Query(..., min_length=1, max_length=200), limit: int = Query(5, ge=1, le=20)) -> dict:
+    """Typeahead suggestions for product names, served from the prefix/trigram index."""
+    index = suggest_index.get()
+    catalog = index.catalog
+    suggestions = [
+        {
+            "item_name": str(catalog.item_names[row]),
+            "product_code": catalog.code(row),
+            "subsidy_level": catalog.subsidy_level(row),
+            "score": round(score, 2),
+        }
+        for row, score in index.suggest_rows(q, top_k=limit)
+    ]
+    return {"query": q, "catalog_version": index.version, "suggestions": suggestions}
@@ -0,0 +1,57 @@
+"""Memoized product-name resolution for `ProductDetailAgent`.
+
+Carts repeat the same strings ("2% milk 4L", "white bread") all day, and each
+one otherwise reruns the exact-match lookup and a fuzzy scan of the whole
+catalog. This cache maps a normalized query to its resolution
+`{"product_code", "subsidy_level", "score"}`, with a local LRU in front of
+the shared Redis tier (see tiered_cache), so a string resolved on one worker
+is a dictionary lookup on every other.
+
+Keys start with the catalog version, so loading a new catalog moves every
+lookup to new keys; old entries age out by TTL. A catalog loaded without a
+version is not cached at all, since its next reload would share its keys. Queries with no match are
+cached too (`product_code` None, `score` the best score found, if any), since
+a miss costs the full fuzzy scan. Queries that normalize to the same string
+share one entry.
+
+Environment variables:
+- AGENT_MATCH_CACHE (default 1; set 0 to bypass)
+- AGENT_MATCH_CACHE_TTL_SECONDS (default 604800)
+- AGENT_MATCH_CACHE_LOCAL_SIZE (default 50000 entries per process)
+"""
+
+import os
+from typing import Dict, Optional
+
+from catalog_snapshot import UNVERSIONED
+from tiered_cache import TieredCache
+
+MATCH_CACHE_ENABLED = os.getenv("AGENT_MATCH_CACHE", "1").lower() in {"1", "true", "yes"}
+AGENT_MATCH_CACHE_TTL_SECONDS = int(os.getenv("AGENT_MATCH_CACHE_TTL_SECONDS", "604800"))
+
+# Entries never go stale within a catalog version, so the local tier keeps them as long as Redis does.
+_cache = TieredCache(
+    "product_match",
+    maxsize=int(os.getenv("AGENT_MATCH_CACHE_LOCAL_SIZE", "50000")),
+    ttl=AGENT_MATCH_CACHE_TTL_SECONDS,
+    local_ttl=AGENT_MATCH_CACHE_TTL_SECONDS,
+)
+
+
+def match_key(catalog_version: Optional[str], norm_query: str) -> Optional[str]:
+    if not MATCH_CACHE_ENABLED or not norm_query or not catalog_version or catalog_version == UNVERSIONED:
+        return None
+    return f"{catalog_version}:{norm_query}"
+
+
+def lookup(key: str) -> Optional[Dict]:
+    value, _ = _cache.get(key)
+    return value
+
+
+def store(key: str, product_code: Optional[str], subsidy_level: Optional[str], score: Optional[float]) -> None:
+    _cache.set(key, {"product_code": product_code, "subsidy_level": subsidy_level, "score": score})
+
+
+def clear_local() -> None:
+    _cache.clear_local()
@@ -0,0 +1,145 @@
+"""Per-stage timing spans and Prometheus metrics for Agentic-AI.
+
+Wrap a unit of work in `stage("name")` to record its duration in the
+`agent_stage_seconds` histogram and, when a `collect_spans()` block is active
+in the current context, in a per-request breakdown (milliseconds by stage)
+that tasks can attach to their results.
+
+The API exposes metrics at `/metrics` (see main.py). Celery workers start an
+exporter on CELERY_METRICS_PORT. Under the prefork pool, set
+PROMETHEUS_MULTIPROC_DIR to a writable, empty directory for every process so
+metrics recorded in the children are aggregated by the exporter.
+
+If `prometheus_client` is not installed, every metric is a no-op and spans
+still work.
+"""
+
+import contextvars
+import os
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
+
+try:
+    import prometheus_client
+    from prometheus_client import CollectorRegistry, Counter, Histogram, multiprocess
+except ImportError:  # metrics are optional
+    prometheus_client = None
+
+_STAGE_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+class _NoopMetric:
+    def labels(self, *args, **kwargs) -> "_NoopMetric":
+        return self
+
+    def observe(self, *args, **kwargs) -> None:
+        pass
+
+    def inc(self, *args, **kwargs) -> None:
+        pass
+
+
+if prometheus_client is not None:
+    STAGE_SECONDS = Histogram(
+        "agent_stage_seconds", "Time spent in each pipeline stage", ["stage"], buckets=_STAGE_BUCKETS
+    )
+    CACHE_EVENTS = Counter("agent_cache_events_total", "Cache lookups by cache and outcome", ["cache", "outcome"])
+    LLM_TOKENS = Counter("agent_llm_tokens_total", "LLM tokens consumed", ["model", "kind"])
+    RETRIES = Counter("agent_retries_total", "Retried operations", ["operation"])
+    LLM_CALL_SECONDS = Histogram(
+        "agent_llm_call_seconds", "LLM call latency by routing tier", ["tier"], buckets=_STAGE_BUCKETS
+    )
+    LLM_CALLS = Counter(
+        "agent_llm_calls_total", "LLM calls by routing tier and outcome (accepted, rejected, error, timeout)", ["tier", "outcome"]
+    )
+    LLM_HEDGES = Counter("agent_llm_hedges_total", "Hedged duplicate LLM requests by tier and winner", ["tier", "winner"])
+else:
+    STAGE_SECONDS = CACHE_EVENTS = LLM_TOKENS = RETRIES = LLM_CALL_SECONDS = LLM_CALLS = LLM_HEDGES = _NoopMetric()
+
+_spans: contextvars.ContextVar[Optional[Dict[str, float]]] = contextvars.ContextVar("agent_spans", default=None)
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Time the enclosed block as pipeline stage `name`."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        STAGE_SECONDS.labels(stage=name).observe(elapsed)
+        spans = _spans.get()
+        if spans is not None:
+            spans[name] = round(spans.get(name, 0.0) + elapsed * 1000, 3)
+
+
+@contextmanager
+def collect_spans() -> Iterator[Dict[str, float]]:
+    """Collect stage timings (ms) recorded in this context into a dict."""
+    spans: Dict[str, float] = {}
+    token = _spans.set(spans)
+    try:
+        yield spans
+    finally:
+        _spans.reset(token)
+
+
+def record_cache(cache: str, outcome: str) -> None:
+    CACHE_EVENTS.labels(cache=cache, outcome=outcome).inc()
+
+
+def record_retry(operation: str) -> None:
+    RETRIES.labels(operation=operation).inc()
+
+
+def record_llm_usage(model: str, usage: Optional[Dict]) -> None:
+    """Count tokens from a LangChain message's `usage_metadata`."""
+    if not usage:
+        return
+    for kind in ("input_tokens", "output_tokens"):
+        if usage.get(kind):
+            LLM_TOKENS.labels(model=model, kind=kind.split("_")[0]).inc(usage[kind])
+
+
+def record_llm_call(tier: str, seconds: float, outcome: str) -> None:
+    """Record one routed LLM call; fast-tier calls that are not "accepted" escalate."""
+    LLM_CALL_SECONDS.labels(tier=tier).observe(seconds)
+    LLM_CALLS.labels(tier=tier, outcome=outcome).inc()
+
+
+def record_llm_hedge(tier: str, winner: str) -> None:
+    """Count a hedged LLM request; `winner` is "primary" or "hedge"."""
+    LLM_HEDGES.labels(tier=tier, winner=winner).inc()
+
+
+def _registry():
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return registry
+    return prometheus_client.REGISTRY
+
+
+def metrics_asgi_app():
+    """ASGI app serving the Prometheus exposition format, or None."""
+    if prometheus_client is None:
+        return None
+    return prometheus_client.make_asgi_app(registry=_registry())
+
+
+def start_worker_exporter(port: int) -> None:
+    """Serve worker metrics on `port` from the current (parent) process."""
+    if prometheus_client is None:
+        print("prometheus_client not installed; worker metrics exporter disabled")
+        return
+    if not os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        print("PROMETHEUS_MULTIPROC_DIR is not set; only metrics from this process will be exported")
+    prometheus_client.start_http_server(port, registry=_registry())
+    print(f"Worker metrics exporter listening on :{port}")
+
+
+def mark_process_dead(pid: int) -> None:
+    """Drop a recycled child's live gauges in multiprocess mode."""
+    if prometheus_client is not None and os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        multiprocess.mark_process_dead(pid)
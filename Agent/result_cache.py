@@ -0,0 +1,66 @@
+"""End-to-end cache of per-item cart results, in front of `_process_single`.
+
+Entries are keyed by catalog version, subsidy index version, community ID and
+normalized product name. The catalog version comes from the loaded catalog
+snapshot. The subsidy index version is the Weaviate class this worker's alias
+resolver currently reads from, plus a Redis counter that `vector.py` and
+`weaviate_cleanup.py` bump. The class matters because resolvers pick up an
+alias swap only after WEAVIATE_ALIAS_TTL_SECONDS: a worker still reading the
+old class keeps writing under the old class's keys, which no worker reads
+once it has switched. Re-ingesting either source moves every lookup to new
+keys, and the old entries age out by TTL. While the counter cannot be read,
+results are neither looked up nor stored.
+
+Environment variables:
+- AGENT_RESULT_CACHE (default 1; set 0 to bypass)
+- AGENT_RESULT_CACHE_TTL_SECONDS (default 86400)
+- AGENT_RESULT_CACHE_LOCAL_SIZE (default 10000 entries per process)
+"""
+
+import os
+from typing import Dict, Optional, Tuple
+
+from catalog_snapshot import UNVERSIONED, normalize_name
+from tiered_cache import TieredCache, get_data_version
+
+SUBSIDY_INDEX = "subsidy_index"
+RESULT_CACHE_ENABLED = os.getenv("AGENT_RESULT_CACHE", "1").lower() in {"1", "true", "yes"}
+
+_UNCACHEABLE_DISCOUNTS = {None, "", "None", "Not found"}
+_PER_REQUEST_KEYS = {"cart_item_id", "timings_ms", "cache"}
+
+_cache = TieredCache(
+    "cart_result",
+    maxsize=int(os.getenv("AGENT_RESULT_CACHE_LOCAL_SIZE", "10000")),
+    ttl=int(os.getenv("AGENT_RESULT_CACHE_TTL_SECONDS", "86400")),
+)
+
+
+def subsidy_index_version(index_class: str) -> Optional[str]:
+    """None while the counter cannot be read: nothing keyed on it may be cached then."""
+    counter = get_data_version(SUBSIDY_INDEX)
+    return None if counter is None else f"{index_class}.{counter}"
+
+
+def result_key(community_id: str, product_name: str, catalog_version: str, subsidy_version: Optional[str]) -> Optional[str]:
+    norm = normalize_name(product_name)
+    if not RESULT_CACHE_ENABLED or not norm or catalog_version == UNVERSIONED or subsidy_version is None:
+        return None
+    return f"{catalog_version}:{subsidy_version}:{community_id.strip()}:{norm}"
+
+
+def lookup(key: str) -> Tuple[Optional[Dict], str]:
+    return _cache.get(key)
+
+
+def is_cacheable(result: Dict) -> bool:
+    """Cache no-match results and real discounts, never transient failures or unvalidated answers."""
+    if result.get("unfinished") or result.get("validated") is False:
+        return False
+    if not result.get("subsidy_level"):
+        return result.get("product_code") is None
+    return result.get("discount_per_kg") not in _UNCACHEABLE_DISCOUNTS
+
+
+def store(key: str, result: Dict) -> None:
+    _cache.set(key, {k: v for k, v in result.items() if k not in _PER_REQUEST_KEYS})
@@ -0,0 +1,130 @@
+"""Compact Celery payloads: a msgpack serializer and a columnar cart result.
+
+`dumps`/`loads` pack with ormsgpack and zstd-compress bodies larger than
+COMPRESS_THRESHOLD_BYTES. The first byte of every body records whether it was
+compressed, so small messages skip the compressor and both kinds decode the
+same way. `register_serializer` makes the codec available to kombu under
+SERIALIZER_NAME.
+
+`to_columnar` turns a cart result's list of per-item dicts into one list per
+field, storing each field name once and fields that hold the same value for
+every item (e.g. `community_id`) once per cart. `from_columnar` restores the
+original list of dicts; results that are not columnar pass through unchanged.
+
+Environment variables:
+- CELERY_COMPRESS_THRESHOLD_BYTES (default 4096; 0 disables compression)
+"""
+
+import os
+from typing import Any, Dict, List
+
+try:
+    import ormsgpack
+except ImportError:  # JSON only
+    ormsgpack = None
+
+try:
+    import zstandard
+except ImportError:  # msgpack without compression
+    zstandard = None
+
+SERIALIZER_NAME = "msgpack-z"
+CONTENT_TYPE = "application/x-agent-msgpack"
+COMPRESS_THRESHOLD_BYTES = int(os.getenv("CELERY_COMPRESS_THRESHOLD_BYTES", "4096"))
+COLUMNAR_FORMAT = "columnar/1"
+
+_RAW = b"\x00"
+_ZSTD = b"\x01"
+_PACK_OPTIONS = (ormsgpack.OPT_NON_STR_KEYS | ormsgpack.OPT_SERIALIZE_NUMPY) if ormsgpack else 0
+
+
+def dumps(obj: Any) -> bytes:
+    packed = ormsgpack.packb(obj, option=_PACK_OPTIONS)
+    if zstandard is not None and 0 < COMPRESS_THRESHOLD_BYTES <= len(packed):
+        return _ZSTD + zstandard.ZstdCompressor(level=3).compress(packed)
+    return _RAW + packed
+
+
+def loads(data: bytes) -> Any:
+    data = bytes(data)
+    if data[:1] == _ZSTD:
+        if zstandard is None:
+            raise ValueError("Received a zstd-compressed payload but zstandard is not installed")
+        return ormsgpack.unpackb(zstandard.ZstdDecompressor().decompress(data[1:]))
+    return ormsgpack.unpackb(data[1:])
+
+
+def register_serializer() -> bool:
+    """Register the codec with kombu; False if ormsgpack is unavailable."""
+    if ormsgpack is None:
+        return False
+    from kombu.serialization import register
+
+    register(SERIALIZER_NAME, dumps, loads, content_type=CONTENT_TYPE, content_encoding="binary")
+    return True
+
+
+def _same(a: Any, b: Any) -> bool:
+    """Equal and of the same type, so 0/False and 1/1.0 are not folded into one constant."""
+    if type(a) is not type(b):
+        return False
+    if isinstance(a, dict):
+        return a.keys() == b.keys() and all(_same(v, b[k]) for k, v in a.items())
+    if isinstance(a, (list, tuple)):
+        return len(a) == len(b) and all(_same(x, y) for x, y in zip(a, b))
+    return a == b
+
+
+def to_columnar(result: Dict[str, Any], key: str = "products") -> Dict[str, Any]:
+    """Return `result` with its `key` list of dicts stored column-wise."""
+    items: List[Dict[str, Any]] = result.get(key) or []
+    fields: List[str] = []
+    for item in items:
+        for field in item:
+            if field not in fields:
+                fields.append(field)
+
+    columns: Dict[str, list] = {}
+    constants: Dict[str, Any] = {}
+    absent: Dict[str, List[int]] = {}
+    for field in fields:
+        values = [item.get(field) for item in items]
+        missing = [i for i, item in enumerate(items) if field not in item]
+        if missing:
+            absent[field] = missing
+        elif len(items) > 1 and all(_same(v, values[0]) for v in values[1:]):
+            constants[field] = values[0]
+            continue
+        columns[field] = values
+
+    packed = {k: v for k, v in result.items() if k != key}
+    packed[key] = {
+        "format": COLUMNAR_FORMAT,
+        "count": len(items),
+        "fields": fields,
+        "columns": columns,
+        "constants": constants,
+        "absent": absent,
+    }
+    return packed
+
+
+def from_columnar(result: Any, key: str = "products") -> Any:
+    """Inverse of `to_columnar`; other results are returned unchanged."""
+    if not isinstance(result, dict):
+        return result
+    packed = result.get(key)
+    if not isinstance(packed, dict) or packed.get("format") != COLUMNAR_FORMAT:
+        return result
+
+    columns, constants = packed["columns"], packed["constants"]
+    absent = {field: set(rows) for field, rows in packed["absent"].items()}
+    items = []
+    for i in range(packed["count"]):
+        item = {}
+        for field in packed["fields"]:
+            if i in absent.get(field, ()):
+                continue
+            item[field] = constants[field] if field in constants else columns[field][i]
+        items.append(item)
+    return {**result, key: items}
@@ -10,14 +10,33 @@ from weaviate.auth import AuthApiKey
 from urllib.parse import urlparse
 from langchain.docstore.document import Document
 from weaviate import Client as V3Client
+from weaviate.classes.init import AdditionalConfig, Timeout
+from weaviate.classes.query import MetadataQuery
 import time
-from typing import Optional
+import atexit
+import threading
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Optional, Tuple
 import requests
+from index_alias import AliasResolver
+import deadline
+import llm_budget
+from metrics import record_llm_call, record_llm_hedge, record_llm_usage, record_retry, stage
 
 dotenv_path = Path(__file__).resolve().parent.parent / ".env"
 load_dotenv(dotenv_path=dotenv_path)
 os.environ["TOKENIZERS_PARALLELISM"] = "false"
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
+# Validated extraction tries LLM_FAST_MODEL first and escalates to LLM_LARGE_MODEL
+# when its answer fails validation; an empty LLM_FAST_MODEL always uses the large model.
+LLM_FAST_MODEL = os.getenv("LLM_FAST_MODEL", "llama-3.1-8b-instant")
+LLM_LARGE_MODEL = os.getenv("LLM_LARGE_MODEL", "llama-3.3-70b-versatile")
+# Groq-compatible endpoint override, e.g. benchmarks/fake_llm_server.py.
+LLM_BASE_URL = os.getenv("LLM_BASE_URL") or None
+# Per-request HTTP timeout, so calls abandoned by a deadline or a won hedge
+# still end and free their pool thread.
+LLM_REQUEST_TIMEOUT_SECONDS = float(os.getenv("LLM_REQUEST_TIMEOUT_SECONDS", "60"))
 
 # print("From Python:", GROQ_API_KEY)
 # load_dotenv(dotenv_path=".env")
@@ -27,12 +46,41 @@ GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 # print("From Python:", GROQ_API_KEY)
 
 EMBEDDINGS_MODEL_NAME = os.getenv("EMBEDDINGS_MODEL_NAME", "sentence-transformers/all-mpnet-base-v2")
-embedding_model = HuggingFaceEmbeddings(model_name=EMBEDDINGS_MODEL_NAME)
+class LazyEmbeddings:
+	"""Load the sentence-transformers model on first use instead of at import.
+
+	Keeps `import shared` cheap and offline-safe (benchmarks, API process) while
+	behaving like `HuggingFaceEmbeddings` for callers.
+	"""
+	def __init__(self, model_name: str):
+		self.model_name = model_name
+		self._model: Optional[HuggingFaceEmbeddings] = None
+		self._lock = threading.Lock()
+
+	def load(self) -> HuggingFaceEmbeddings:
+		if self._model is None:
+			with self._lock:
+				if self._model is None:
+					self._model = HuggingFaceEmbeddings(model_name=self.model_name)
+		return self._model
+
+	def embed_query(self, text: str):
+		return self.load().embed_query(text)
+
+	def embed_documents(self, texts):
+		return self.load().embed_documents(texts)
+
+embedding_model = LazyEmbeddings(EMBEDDINGS_MODEL_NAME)
 
 WEAVIATE_HOST = os.getenv("WEAVIATE_HOST", "http://localhost:8080")
 WEAVIATE_API_KEY = os.getenv("WEAVIATE_API_KEY") or None
 WEAVIATE_CLASS_NAME = os.getenv("WEAVIATE_CLASS_NAME", "ProductChunk")
 WEAVIATE_STARTUP_TIMEOUT_SECONDS = int(os.getenv("WEAVIATE_STARTUP_TIMEOUT_SECONDS", "5"))
+WEAVIATE_QUERY_TIMEOUT_SECONDS = int(os.getenv("WEAVIATE_QUERY_TIMEOUT_SECONDS", "30"))
+# "graphql" queries through the v3 client over HTTP; "grpc" uses the v4 client on grpc_port.
+WEAVIATE_QUERY_PROTOCOL = os.getenv("WEAVIATE_QUERY_PROTOCOL", "graphql").lower()
+# How long readers cache the class the WEAVIATE_CLASS_NAME alias points to.
+WEAVIATE_ALIAS_TTL_SECONDS = float(os.getenv("WEAVIATE_ALIAS_TTL_SECONDS", "10"))
 
 parsed = urlparse(WEAVIATE_HOST)
 http_host = parsed.hostname or "localhost"
@@ -43,6 +91,10 @@ grpc_port = int(os.getenv("WEAVIATE_GRPC_PORT", "50051"))
 grpc_secure = http_secure
 
 _weaviate_client: Optional[V3Client] = None
+_client_lock = threading.Lock()
+
+WEAVIATE_BREAKER_COOLDOWN_SECONDS = float(os.getenv("WEAVIATE_BREAKER_COOLDOWN_SECONDS", "30"))
+WEAVIATE_HEALTH_PROBE_INTERVAL_SECONDS = float(os.getenv("WEAVIATE_HEALTH_PROBE_INTERVAL_SECONDS", "5"))
 
 def _weaviate_ready(url: str, timeout: float = 1.0) -> bool:
 	"""HTTP readiness probe compatible with Weaviate v1 REST readiness endpoint."""
@@ -53,45 +105,227 @@ def _weaviate_ready(url: str, timeout: float = 1.0) -> bool:
 	except Exception:
 		return False
 
+class CircuitBreaker:
+	"""Closed/open/half-open breaker guarding the Weaviate endpoint.
+
+	While open, callers fail fast instead of re-running the startup retry loop.
+	A daemon thread probes readiness in the background and moves the breaker to
+	half-open as soon as the endpoint answers, or once the cooldown elapses, so
+	the next request gets a single trial connection attempt.
+	"""
+	CLOSED = "closed"
+	OPEN = "open"
+	HALF_OPEN = "half_open"
+
+	def __init__(self, probe, cooldown: float, probe_interval: float):
+		self._probe = probe  # callable returning True when the endpoint is healthy
+		self.cooldown = cooldown
+		self.probe_interval = probe_interval
+		self._lock = threading.Lock()
+		self._state = self.CLOSED
+		self._opened_at = 0.0
+		self._trial_in_flight = False
+		self._prober: Optional[threading.Thread] = None
+		self.trips = 0
+		self.failures = 0
+		self.successes = 0
+		self.rejections = 0
+		self.last_error: Optional[str] = None
+
+	@property
+	def state(self) -> str:
+		with self._lock:
+			self._maybe_half_open()
+			return self._state
+
+	def _maybe_half_open(self) -> None:
+		if self._state == self.OPEN and time.time() - self._opened_at >= self.cooldown:
+			self._state = self.HALF_OPEN
+			self._trial_in_flight = False
+
+	def allow_request(self) -> bool:
+		"""Return True if the caller may attempt a connection right now."""
+		with self._lock:
+			self._maybe_half_open()
+			if self._state == self.CLOSED:
+				return True
+			if self._state == self.HALF_OPEN and not self._trial_in_flight:
+				self._trial_in_flight = True
+				return True
+			self.rejections += 1
+			return False
+
+	def record_success(self) -> None:
+		with self._lock:
+			self.successes += 1
+			self._state = self.CLOSED
+			self._trial_in_flight = False
+
+	def record_failure(self, err: Optional[BaseException] = None) -> None:
+		with self._lock:
+			self.failures += 1
+			if err is not None:
+				self.last_error = repr(err)
+			if self._state != self.OPEN:
+				self.trips += 1
+			self._state = self.OPEN
+			self._opened_at = time.time()
+			self._trial_in_flight = False
+			self._start_prober()
+
+	def _start_prober(self) -> None:
+		# Caller holds self._lock.
+		if self._prober is not None and self._prober.is_alive():
+			return
+		self._prober = threading.Thread(target=self._probe_loop, name="weaviate-health-probe", daemon=True)
+		self._prober.start()
+
+	def _probe_loop(self) -> None:
+		while True:
+			time.sleep(self.probe_interval)
+			with self._lock:
+				if self._state != self.OPEN:
+					return
+			if self._probe():
+				with self._lock:
+					if self._state == self.OPEN:
+						self._state = self.HALF_OPEN
+						self._trial_in_flight = False
+				return
+
+	def snapshot(self) -> dict:
+		with self._lock:
+			self._maybe_half_open()
+			return {
+				"state": self._state,
+				"trips": self.trips,
+				"failures": self.failures,
+				"successes": self.successes,
+				"rejections": self.rejections,
+				"last_error": self.last_error,
+				"opened_at": self._opened_at or None,
+				"cooldown_seconds": self.cooldown,
+			}
+
+weaviate_breaker = CircuitBreaker(
+	probe=lambda: _weaviate_ready(WEAVIATE_HOST, timeout=1.0),
+	cooldown=WEAVIATE_BREAKER_COOLDOWN_SECONDS,
+	probe_interval=WEAVIATE_HEALTH_PROBE_INTERVAL_SECONDS,
+)
+
+def get_weaviate_breaker_status() -> dict:
+	"""Expose breaker state and trip counts for health endpoints and logs."""
+	return weaviate_breaker.snapshot()
+
+def report_weaviate_failure(err: Optional[BaseException] = None) -> None:
+	"""Drop the cached client and trip the breaker after a failed request."""
+	global _weaviate_client
+	with _client_lock:
+		_weaviate_client = None
+		_close_v4_client()
+	weaviate_breaker.record_failure(err)
+
 def get_weaviate_client(force: bool = False) -> Optional[V3Client]:
 	"""Create or return a cached Weaviate V3 client.
     Delays creation until first use and tolerates temporary startup unavailability
-    by retrying for WEAVIATE_STARTUP_TIMEOUT_SECONDS.
-    Returns None if unreachable after retries so callers can degrade gracefully.
+    by retrying for WEAVIATE_STARTUP_TIMEOUT_SECONDS while the breaker is closed.
+    Once that fails the breaker opens and calls return None immediately until the
+    background probe or the cooldown lets a single half-open attempt through.
+    Returns None if unreachable so callers can degrade gracefully.
     """
 	global _weaviate_client
 	if _weaviate_client is not None and not force:
 		return _weaviate_client
 
-	deadline = time.time() + WEAVIATE_STARTUP_TIMEOUT_SECONDS
+	if not weaviate_breaker.allow_request():
+		return None
+
+	trial = weaviate_breaker.state == CircuitBreaker.HALF_OPEN
+	timeout = 1.0 if trial else WEAVIATE_STARTUP_TIMEOUT_SECONDS
+	probe_until = time.time() + timeout
 	last_err: Optional[Exception] = None
-	while time.time() < deadline:
+	while True:
 		try:
 			client = V3Client(
 				url=WEAVIATE_HOST,
 				auth_client_secret=AuthApiKey(WEAVIATE_API_KEY) if WEAVIATE_API_KEY else None,
 			)
 			if _weaviate_ready(WEAVIATE_HOST, timeout=1.0):
-				_weaviate_client = client
-				return _weaviate_client
+				with _client_lock:
+					_weaviate_client = client
+				weaviate_breaker.record_success()
+				return client
 		except Exception as e:
 			last_err = e
-			time.sleep(0.5)
-		else:
-			# not ready yet
-			time.sleep(0.5)
+		if trial or time.time() >= probe_until:
+			break
+		record_retry("weaviate_connect")
+		time.sleep(0.5)
 
 	print(f"Weaviate client unavailable at {WEAVIATE_HOST}: {last_err}")
-	_weaviate_client = None
+	report_weaviate_failure(last_err)
 	return None
 
+_weaviate_v4_client = None
+
+def _close_v4_client() -> None:
+	global _weaviate_v4_client
+	client, _weaviate_v4_client = _weaviate_v4_client, None
+	if client is not None:
+		try:
+			client.close()
+		except Exception:
+			pass
+
+atexit.register(_close_v4_client)
+
+def get_weaviate_v4_client(force: bool = False):
+	"""Create or return a cached Weaviate v4 (gRPC) client.
+    The v4 client keeps one persistent HTTP/2 channel to grpc_host:grpc_port, so
+    caching it per process gives every query a warm, multiplexed connection.
+    Shares the circuit breaker with the v3 client and returns None while it is open.
+    """
+	global _weaviate_v4_client
+	if _weaviate_v4_client is not None and not force:
+		return _weaviate_v4_client
+	if not weaviate_breaker.allow_request():
+		return None
+
+	try:
+		client = weaviate.connect_to_custom(
+			http_host=http_host,
+			http_port=http_port,
+			http_secure=http_secure,
+			grpc_host=grpc_host,
+			grpc_port=grpc_port,
+			grpc_secure=grpc_secure,
+			auth_credentials=AuthApiKey(WEAVIATE_API_KEY) if WEAVIATE_API_KEY else None,
+			additional_config=AdditionalConfig(
+				timeout=Timeout(init=WEAVIATE_STARTUP_TIMEOUT_SECONDS, query=WEAVIATE_QUERY_TIMEOUT_SECONDS, insert=90),
+			),
+		)
+	except Exception as e:
+		print(f"Weaviate gRPC client unavailable at {grpc_host}:{grpc_port}: {e}")
+		report_weaviate_failure(e)
+		return None
+
+	with _client_lock:
+		_close_v4_client()
+		_weaviate_v4_client = client
+	weaviate_breaker.record_success()
+	return client
+
 class WeaviateV3VectorStore:
-	def __init__(self, client_provider, embedding: object, index_name: str, text_key: str = "text"):
+	def __init__(self, client_provider, embedding: object, index_name, text_key: str = "text"):
 		self._client_provider = client_provider  # callable returning client or None
 		self.embedding = embedding
-		self.index_name = index_name
+		self._index_name = index_name  # class name, or callable resolving an alias
 		self.text_key = text_key
 
+	@property
+	def index_name(self) -> str:
+		return self._index_name() if callable(self._index_name) else self._index_name
+
 	def _get_client_or_none(self) -> Optional[V3Client]:
 		return self._client_provider()
 
@@ -100,7 +334,10 @@ class WeaviateV3VectorStore:
 		if client is None:
 			return []
 
-		query_vector = self.embedding.embed_query(query)
+		# Resolve once so both queries and the response parsing use the same class.
+		index_name = self.index_name
+		with stage("embedding"):
+			query_vector = self.embedding.embed_query(query)
 		props = [
 			self.text_key,
 			"page",
@@ -110,29 +347,37 @@ class WeaviateV3VectorStore:
 			"recursive_idx",
 		]
 		# Vector search
-		try:
-			vec_resp = (
-				client.query.get(self.index_name, props)
-				.with_near_vector({"vector": query_vector})
-				.with_additional(["distance", "id"])  # include id to help de-dup
-				.with_limit(k)
-				.do()
-			)
-			vec_items = vec_resp.get("data", {}).get("Get", {}).get(self.index_name, [])
-		except Exception:
-			vec_items = []
+		with stage("weaviate_vector"):
+			try:
+				vec_resp = (
+					client.query.get(index_name, props)
+					.with_near_vector({"vector": query_vector})
+					.with_additional(["distance", "id"])  # include id to help de-dup
+					.with_limit(k)
+					.do()
+				)
+				vec_items = vec_resp.get("data", {}).get("Get", {}).get(index_name, [])
+			except Exception as e:
+				vec_items = []
+				vec_err = e
+			else:
+				vec_err = None
 
-		try:
-			bm25_resp = (
-				client.query.get(self.index_name, props)
-				.with_bm25(query=query)
-				.with_additional(["score", "id"])  # include id to help de-dup
-				.with_limit(k)
-				.do()
-			)
-			bm25_items = bm25_resp.get("data", {}).get("Get", {}).get(self.index_name, [])
-		except Exception:
-			bm25_items = []
+		with stage("weaviate_bm25"):
+			try:
+				bm25_resp = (
+					client.query.get(index_name, props)
+					.with_bm25(query=query)
+					.with_additional(["score", "id"])  # include id to help de-dup
+					.with_limit(k)
+					.do()
+				)
+				bm25_items = bm25_resp.get("data", {}).get("Get", {}).get(index_name, [])
+			except Exception as e:
+				bm25_items = []
+				if vec_err is not None:
+					# Both queries raised: treat the endpoint as down so later calls fail fast.
+					report_weaviate_failure(e)
 
 		# Merge: prefer vector results; fill remaining with BM25 uniques
 		by_id = {}
@@ -164,14 +409,132 @@ class WeaviateV3VectorStore:
 		return documents
 
 
-vectorstore = WeaviateV3VectorStore(
+class WeaviateV4VectorStore:
+	"""gRPC-backed store with the same `similarity_search` contract as the v3 store.
+
+	Queries go through the v4 collections API, which sends protobuf over the
+	persistent gRPC channel instead of GraphQL JSON over HTTP.
+	"""
+	metadata_keys = ["page", "product_code", "category", "source", "recursive_idx"]
+
+	def __init__(self, client_provider, embedding: object, index_name, text_key: str = "text"):
+		self._client_provider = client_provider  # callable returning v4 client or None
+		self.embedding = embedding
+		self._index_name = index_name  # class name, or callable resolving an alias
+		self.text_key = text_key
+
+	@property
+	def index_name(self) -> str:
+		return self._index_name() if callable(self._index_name) else self._index_name
+
+	def similarity_search(self, query: str, k: int = 5):
+		client = self._client_provider()
+		if client is None:
+			return []
+
+		with stage("embedding"):
+			query_vector = self.embedding.embed_query(query)
+		props = [self.text_key, *self.metadata_keys]
+		collection = client.collections.get(self.index_name)
+
+		with stage("weaviate_vector"):
+			try:
+				vec_items = collection.query.near_vector(
+					near_vector=query_vector,
+					limit=k,
+					return_properties=props,
+					return_metadata=MetadataQuery(distance=True),
+				).objects
+			except Exception as e:
+				vec_items = []
+				vec_err = e
+			else:
+				vec_err = None
+
+		with stage("weaviate_bm25"):
+			try:
+				bm25_items = collection.query.bm25(
+					query=query,
+					limit=k,
+					return_properties=props,
+					return_metadata=MetadataQuery(score=True),
+				).objects
+			except Exception as e:
+				bm25_items = []
+				if vec_err is not None:
+					report_weaviate_failure(e)
+
+		# Merge: prefer vector results; fill remaining with BM25 uniques
+		seen = set()
+		ordered = []
+		for obj in vec_items:
+			if obj.uuid not in seen:
+				seen.add(obj.uuid)
+				ordered.append(obj)
+		for obj in bm25_items:
+			if obj.uuid not in seen:
+				seen.add(obj.uuid)
+				ordered.append(obj)
+				if len(ordered) >= k:
+					break
+
+		documents = []
+		for obj in ordered[:k]:
+			properties = obj.properties or {}
+			metadata = {key: properties.get(key) for key in self.metadata_keys}
+			documents.append(Document(page_content=properties.get(self.text_key) or "", metadata=metadata))
+		return documents
+
+
+# WEAVIATE_CLASS_NAME is an alias: blue/green ingestion (`vector.py --blue-green`)
+# builds versioned classes and repoints it once the new class validates.
+resolve_weaviate_class = AliasResolver(
+	WEAVIATE_CLASS_NAME,
 	client_provider=lambda: get_weaviate_client(),
-	embedding=embedding_model,
-	index_name=WEAVIATE_CLASS_NAME,
-	text_key="text",
+	ttl=WEAVIATE_ALIAS_TTL_SECONDS,
 )
 
-llm = ChatGroq(model_name="llama-3.3-70b-versatile", api_key=GROQ_API_KEY, temperature=0)
+
+def build_vectorstore(protocol: str = WEAVIATE_QUERY_PROTOCOL):
+	"""Return the store for `protocol`: "grpc" (v4 client) or "graphql" (v3 client)."""
+	if protocol == "grpc":
+		return WeaviateV4VectorStore(
+			client_provider=lambda: get_weaviate_v4_client(),
+			embedding=embedding_model,
+			index_name=resolve_weaviate_class,
+			text_key="text",
+		)
+	return WeaviateV3VectorStore(
+		client_provider=lambda: get_weaviate_client(),
+		embedding=embedding_model,
+		index_name=resolve_weaviate_class,
+		text_key="text",
+	)
+
+vectorstore = build_vectorstore()
+
+# Created on first use by get_llm(); assign a chat model here to substitute it.
+llm = None  # large tier
+fast_llm = None
+
+def _groq_model(model_name: str):
+	return ChatGroq(
+		model_name=model_name,
+		api_key=GROQ_API_KEY,
+		temperature=0,
+		base_url=LLM_BASE_URL,
+		request_timeout=LLM_REQUEST_TIMEOUT_SECONDS,
+	)
+
+def get_llm(tier: str = "large"):
+	global llm, fast_llm
+	if tier == "fast":
+		if fast_llm is None:
+			fast_llm = _groq_model(LLM_FAST_MODEL)
+		return fast_llm
+	if llm is None:
+		llm = _groq_model(LLM_LARGE_MODEL)
+	return llm
 
 def get_pdf_text(pdf_path: str) -> str:
 	try:
@@ -181,6 +544,174 @@ def get_pdf_text(pdf_path: str) -> str:
 		print(f"Error reading PDF: {e}")
 		return ""
 
-def query_llm(prompt: str) -> str:
-	response = llm.invoke(prompt)
-	return response.content.strip()
\ No newline at end of file
+# Interactive LLM calls still running after their tier's p95 latency get a
+# duplicate request; the first answer wins. Until LLM_HEDGE_MIN_SAMPLES calls
+# have been seen, LLM_HEDGE_DEFAULT_DELAY_SECONDS stands in for the p95.
+# No hedge is sent while all LLM_POOL_SIZE threads are taken: it would only
+# queue behind the calls it is meant to overtake.
+LLM_HEDGE_ENABLED = os.getenv("LLM_HEDGE_ENABLED", "1").lower() in {"1", "true", "yes"}
+LLM_HEDGE_DEFAULT_DELAY_SECONDS = float(os.getenv("LLM_HEDGE_DEFAULT_DELAY_SECONDS", "2"))
+LLM_HEDGE_MIN_SAMPLES = 20
+LLM_POOL_SIZE = int(os.getenv("LLM_POOL_SIZE", "16"))
+_llm_pool = ThreadPoolExecutor(max_workers=LLM_POOL_SIZE, thread_name_prefix="llm")
+_llm_pending = 0  # submitted calls not yet finished or cancelled
+_llm_pending_lock = threading.Lock()
+
+def _llm_call_done(_future) -> None:
+	global _llm_pending
+	with _llm_pending_lock:
+		_llm_pending -= 1
+
+def _submit_llm(*args):
+	global _llm_pending
+	with _llm_pending_lock:
+		_llm_pending += 1
+	future = _llm_pool.submit(*args)
+	future.add_done_callback(_llm_call_done)
+	return future
+
+def _llm_pool_saturated() -> bool:
+	with _llm_pending_lock:
+		return _llm_pending >= LLM_POOL_SIZE
+
+class LatencyWindow:
+	"""Latencies of the last `size` calls, for the hedge delay."""
+
+	def __init__(self, size: int = 200):
+		self._samples = deque(maxlen=size)
+		self._lock = threading.Lock()
+
+	def add(self, seconds: float) -> None:
+		with self._lock:
+			self._samples.append(seconds)
+
+	def p95(self) -> Optional[float]:
+		with self._lock:
+			if len(self._samples) < LLM_HEDGE_MIN_SAMPLES:
+				return None
+			ordered = sorted(self._samples)
+		return ordered[int(0.95 * (len(ordered) - 1))]
+
+_llm_latency = {"fast": LatencyWindow(), "large": LatencyWindow()}
+
+def _timed_invoke(model, prompt: str, window: LatencyWindow, expires_at: Optional[float]):
+	started = time.perf_counter()
+	if expires_at is not None and started >= expires_at:
+		# Sat in the pool queue past its caller's deadline: nobody waits for the answer.
+		raise deadline.DeadlineExceeded("LLM call dequeued after its deadline")
+	response = model.invoke(prompt)
+	window.add(time.perf_counter() - started)
+	return response
+
+def _hedged_invoke(tier: str, model, model_name: str, prompt: str, timeout: Optional[float]):
+	"""Invoke `model`, hedging once after the tier's p95; raises DeadlineExceeded after `timeout`.
+
+	Time spent queued for a pool thread counts against `timeout`. Calls still
+	queued when the answer arrives or the deadline passes are cancelled; calls
+	already running end by LLM_REQUEST_TIMEOUT_SECONDS.
+	"""
+	started = time.perf_counter()
+	expires_at = None if timeout is None else started + timeout
+	window = _llm_latency[tier]
+	futures = {_submit_llm(_timed_invoke, model, prompt, window, expires_at): "primary"}
+
+	hedged = False
+	try:
+		can_hedge = LLM_HEDGE_ENABLED and llm_budget.current_priority() == llm_budget.INTERACTIVE
+		delay = (window.p95() or LLM_HEDGE_DEFAULT_DELAY_SECONDS) if can_hedge else None
+		if delay is not None and (timeout is None or delay < timeout):
+			done, _ = wait(futures, timeout=delay)
+			# A hedge must not wait on the shared budget or for a pool thread: skip it if either is taken.
+			if not done and not _llm_pool_saturated() and llm_budget.acquire(bucket=model_name, max_wait=0):
+				futures[_submit_llm(_timed_invoke, model, prompt, window, expires_at)] = "hedge"
+				hedged = True
+
+		error = None
+		while futures:
+			left = None if expires_at is None else expires_at - time.perf_counter()
+			done, _ = wait(futures, timeout=left, return_when=FIRST_COMPLETED)
+			if not done:
+				raise deadline.DeadlineExceeded(f"llm_{tier} exceeded its {timeout:.1f}s budget")
+			for future in done:
+				label = futures.pop(future)
+				if future.exception() is None:
+					if hedged:
+						record_llm_hedge(tier, label)
+					return future.result()
+				error = future.exception()
+		raise error
+	finally:
+		for future in futures:
+			future.cancel()
+
+def _invoke_tier(tier: str, prompt: str):
+	"""Call the `tier` model; returns the answer and the model's latency in seconds."""
+	model = get_llm(tier)
+	model_name = getattr(model, "model_name", type(model).__name__)
+	timeout = deadline.stage_timeout(f"llm_{tier}")
+	if timeout is not None and timeout <= 0:
+		raise deadline.DeadlineExceeded(f"No time left for llm_{tier}")
+	wait_started = time.perf_counter()
+	with stage("llm_budget_wait"):
+		budgeted = llm_budget.acquire(bucket=model_name, max_wait=timeout)
+	if not budgeted and llm_budget.current_priority() == llm_budget.BULK:
+		raise llm_budget.LLMBudgetExceeded("No LLM budget left for bulk work")
+	# Interactive calls go ahead even when the shared budget is exhausted,
+	# but only with what is left of the stage's time after the wait.
+	if timeout is not None:
+		timeout -= time.perf_counter() - wait_started
+		if timeout <= 0:
+			raise deadline.DeadlineExceeded(f"No time left for llm_{tier} after waiting for LLM budget")
+	if not budgeted:
+		# Still charged, so bulk work backs off until the overdraft has refilled.
+		llm_budget.debit(bucket=model_name)
+	started = time.perf_counter()
+	with stage(f"llm_{tier}"):
+		response = _hedged_invoke(tier, model, model_name, prompt, timeout)
+	elapsed = time.perf_counter() - started
+	record_llm_usage(model_name, getattr(response, "usage_metadata", None))
+	return response.content.strip(), elapsed
+
+def query_llm(prompt: str, validate=None) -> Tuple[str, bool]:
+	"""Answer `prompt`, trying the fast model first when `validate` is given.
+
+	Returns `(text, validated)`. `validate(text) -> bool` checks the fast
+	model's answer; on rejection, error or timeout the prompt is escalated to
+	the large model. The large model's answer is returned even when `validate`
+	rejects it too, with `validated` False so callers can avoid trusting or
+	caching it. Without `validate`, or with LLM_FAST_MODEL empty, only the
+	large model is used. Each tier is bounded by its deadline budget (see
+	deadline.py) and raises `deadline.DeadlineExceeded` when it runs out.
+	"""
+	with stage("llm"):
+		if validate is not None and LLM_FAST_MODEL:
+			started = time.perf_counter()
+			try:
+				text, elapsed = _invoke_tier("fast", prompt)
+			except llm_budget.LLMBudgetExceeded:
+				raise
+			except deadline.DeadlineExceeded as e:
+				# The fast tier's budget ran out; the large tier gets whatever time is left.
+				print(f"Fast LLM timed out, escalating: {e}")
+				record_llm_call("fast", time.perf_counter() - started, "timeout")
+			except Exception as e:
+				print(f"Fast LLM failed, escalating: {e}")
+				record_llm_call("fast", time.perf_counter() - started, "error")
+			else:
+				accepted = validate(text)
+				record_llm_call("fast", elapsed, "accepted" if accepted else "rejected")
+				if accepted:
+					return text, True
+
+		started = time.perf_counter()
+		try:
+			text, elapsed = _invoke_tier("large", prompt)
+		except deadline.DeadlineExceeded:
+			record_llm_call("large", time.perf_counter() - started, "timeout")
+			raise
+		except Exception:
+			record_llm_call("large", time.perf_counter() - started, "error")
+			raise
+		accepted = validate is None or validate(text)
+		record_llm_call("large", elapsed, "accepted" if accepted else "rejected")
+		return text, accepted
@@ -0,0 +1,192 @@
+"""Typeahead index over the catalog's normalized product names.
+
+Scanning the whole catalog with WRatio on every keystroke is too slow for
+autocomplete, so `SuggestIndex` narrows the search to a small shortlist first:
+
+1. Prefix: the last (partial) token of the query selects a contiguous range
+   of a sorted token vocabulary, a flat array form of a prefix trie. Rows
+   holding the earlier, complete tokens are intersected rarest-first and then
+   filtered to those with a token in that range. Prefixes of up to three
+   characters have precomputed shortlists.
+2. Trigram: if the prefix stage finds too few rows (typos, reordered words),
+   the rows sharing the most character trigrams with the query are added,
+   merging only the rarest trigrams' postings.
+
+Only the shortlist (at most `shortlist` rows) is ranked with rapidfuzz.
+"""
+
+import bisect
+import threading
+import time
+from collections import defaultdict
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from rapidfuzz import fuzz, process
+
+from catalog_snapshot import CatalogSnapshot, normalize_name
+
+SUGGEST_REFRESH_SECONDS = 300
+
+
+def _trigrams(text: str) -> List[str]:
+    padded = f"  {text} "
+    return list({padded[i:i + 3] for i in range(len(padded) - 2)})
+
+
+class SuggestIndex:
+    # Prefixes up to this length get a precomputed shortlist; they match too
+    # many tokens to union their posting lists per keystroke.
+    SHORT_PREFIX_LEN = 3
+    # Upper bound on trigram postings merged per query (rarest trigrams first).
+    TRIGRAM_BUDGET = 20000
+
+    def __init__(self, catalog: CatalogSnapshot, shortlist: int = 200):
+        self.catalog = catalog
+        self.shortlist = shortlist
+        self.version = catalog.version
+
+        names_norm = catalog.names_norm.tolist()
+        row_token_lists = [sorted(set(name.split())) for name in names_norm]
+        self.vocab: List[str] = sorted({t for tokens in row_token_lists for t in tokens})
+        token_id = {t: i for i, t in enumerate(self.vocab)}
+        self.name_len = np.array([len(n) for n in names_norm], dtype=np.int32)
+
+        token_rows: Dict[str, List[int]] = defaultdict(list)
+        trigram_rows: Dict[str, List[int]] = defaultdict(list)
+        prefix_rows: Dict[str, set] = defaultdict(set)
+        row_tokens: List[int] = []
+        row_ptr = [0]
+        for row, (name, tokens) in enumerate(zip(names_norm, row_token_lists)):
+            for token in tokens:
+                token_rows[token].append(row)
+                row_tokens.append(token_id[token])
+                for n in range(1, min(len(token), self.SHORT_PREFIX_LEN) + 1):
+                    prefix_rows[token[:n]].add(row)
+            row_ptr.append(len(row_tokens))
+            for gram in _trigrams(name):
+                trigram_rows[gram].append(row)
+
+        self.token_rows = {t: np.array(rows, dtype=np.int32) for t, rows in token_rows.items()}
+        self.trigram_rows = {g: np.array(rows, dtype=np.int32) for g, rows in trigram_rows.items()}
+        # CSR layout of each row's token ids (sorted vocab ranks).
+        self.row_ptr = np.array(row_ptr, dtype=np.int64)
+        self.row_tokens = np.array(row_tokens, dtype=np.int32)
+        self.short_prefix_rows = {
+            prefix: self._cap(np.fromiter(rows, dtype=np.int32, count=len(rows)))
+            for prefix, rows in prefix_rows.items()
+        }
+
+    def _cap(self, rows: np.ndarray) -> np.ndarray:
+        """Keep the `shortlist` shortest names: closest to what has been typed."""
+        if len(rows) > self.shortlist:
+            rows = rows[np.argpartition(self.name_len[rows], self.shortlist)[:self.shortlist]]
+        return rows
+
+    def _has_token_in_range(self, rows: np.ndarray, lo: int, hi: int) -> np.ndarray:
+        """Mask of `rows` having a token whose vocab rank is in [lo, hi)."""
+        starts = self.row_ptr[rows]
+        lengths = self.row_ptr[rows + 1] - starts
+        seg_starts = np.cumsum(lengths) - lengths
+        positions = np.repeat(starts - seg_starts, lengths) + np.arange(lengths.sum())
+        ids = self.row_tokens[positions]
+        return np.logical_or.reduceat((ids >= lo) & (ids < hi), seg_starts)
+
+    def _prefix_rows(self, tokens: List[str]) -> Optional[np.ndarray]:
+        *complete, partial = tokens
+        lo = bisect.bisect_left(self.vocab, partial)
+        hi = bisect.bisect_left(self.vocab, partial + "\uffff")
+        if lo == hi:
+            return None
+
+        if not complete:
+            if len(partial) <= self.SHORT_PREFIX_LEN:
+                return self.short_prefix_rows.get(partial)
+            return self._cap(np.unique(np.concatenate([self.token_rows[t] for t in self.vocab[lo:hi]])))
+
+        postings = [self.token_rows.get(t) for t in complete]
+        if any(p is None for p in postings):
+            return None
+        postings.sort(key=len)
+        rows = postings[0]
+        for other in postings[1:]:
+            rows = np.intersect1d(rows, other, assume_unique=True)
+            if not len(rows):
+                return None
+        rows = rows[self._has_token_in_range(rows, lo, hi)]
+        return self._cap(rows) if len(rows) else None
+
+    def _trigram_rows(self, norm: str, limit: int) -> np.ndarray:
+        postings = sorted((self.trigram_rows[g] for g in _trigrams(norm) if g in self.trigram_rows), key=len)
+        if not postings:
+            return np.array([], dtype=np.int32)
+        selected, total = [], 0
+        for p in postings:
+            if selected and total + len(p) > self.TRIGRAM_BUDGET:
+                break
+            selected.append(p)
+            total += len(p)
+        rows, counts = np.unique(np.concatenate(selected), return_counts=True)
+        if len(rows) > limit:
+            rows = rows[np.argpartition(-counts, limit)[:limit]]
+        return rows
+
+    def suggest_rows(self, query: str, top_k: int = 5) -> List[Tuple[int, float]]:
+        """Return `(row, score)` pairs for the best `top_k` catalog matches."""
+        norm = normalize_name(query)
+        if not norm:
+            return []
+
+        candidates = self._prefix_rows(norm.split())
+        if candidates is None or len(candidates) < top_k:
+            extra = self._trigram_rows(norm, self.shortlist)
+            candidates = extra if candidates is None else np.union1d(candidates, extra)
+        if not len(candidates):
+            return []
+
+        # Score normalized forms so case and punctuation do not skew short prefixes.
+        names_norm = self.catalog.names_norm
+        choices = {int(row): str(names_norm[row]) for row in candidates}
+        ranked = process.extract(norm, choices, scorer=fuzz.WRatio, limit=top_k)
+        return [(row, float(score)) for _, score, row in ranked]
+
+    def suggest(self, query: str, top_k: int = 5) -> List[Tuple[str, float]]:
+        names = self.catalog.item_names
+        return [(str(names[row]), score) for row, score in self.suggest_rows(query, top_k)]
+
+
+class RefreshingSuggestIndex:
+    """Serve a `SuggestIndex`, rebuilding it in the background when it ages out.
+
+    Requests never wait on a rebuild except for the very first build.
+    """
+
+    def __init__(self, catalog_loader: Callable[[], CatalogSnapshot], refresh_seconds: float = SUGGEST_REFRESH_SECONDS):
+        self._loader = catalog_loader
+        self.refresh_seconds = refresh_seconds
+        self._index: Optional[SuggestIndex] = None
+        self._built_at = 0.0
+        self._lock = threading.Lock()
+        self._refreshing = False
+
+    def get(self) -> SuggestIndex:
+        if self._index is None:
+            with self._lock:
+                if self._index is None:
+                    self._index = SuggestIndex(self._loader())
+                    self._built_at = time.time()
+        elif time.time() - self._built_at > self.refresh_seconds and not self._refreshing:
+            self._refreshing = True
+            threading.Thread(target=self._refresh, name="suggest-index-refresh", daemon=True).start()
+        return self._index
+
+    def _refresh(self) -> None:
+        try:
+            catalog = self._loader()
+            if catalog.version != self._index.version:
+                self._index = SuggestIndex(catalog)
+        except Exception as e:
+            print(f"Suggest index refresh failed: {e}")
+        finally:
+            self._built_at = time.time()
+            self._refreshing = False
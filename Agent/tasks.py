@@ -9,10 +9,16 @@ Defines a task that takes a community_id and a list of product names, runs
 Agent1 and Agent2 for each, and returns the aggregated results.
 """
 
+import os
 from typing import List, Dict, Optional
 from celery_app import celery_app
-from agent1_module import ProductDetailAgent
-from Agent2 import Agent2
+from metrics import collect_spans, stage
+from llm_budget import BULK, INTERACTIVE, priority_scope
+from deadline import DeadlineExceeded, deadline_scope, expired
+import result_cache
+from serialization import to_columnar
+from shared import resolve_weaviate_class
+from worker_resources import get_community_agent, get_product_agent
 
 # @celery_app.task(name="agent.process_products", bind=True)
 # def process_products_task(self, community_id: str, product_names: List[str]) -> List[Dict]:
@@ -48,28 +54,114 @@ from Agent2 import Agent2
 #             results.append(result)
 #     return results
 
+INCLUDE_TIMINGS = os.getenv("AGENT_INCLUDE_TIMINGS", "0").lower() in {"1", "true", "yes"}
+# Return `products` column-wise (see serialization.to_columnar); /predict expands it.
+COLUMNAR_RESULTS = os.getenv("AGENT_COLUMNAR_RESULTS", "1").lower() in {"1", "true", "yes"}
+
 @celery_app.task(name="agent.process_products", bind=True)
-def process_products_task(self, cart_id: str, community_id: str, product_names: List[dict]) -> Dict:
-    agent1 = ProductDetailAgent()
-    agent2 = Agent2(community_id.strip())
+def process_products_task(self, cart_id: str, community_id: str, product_names: List[dict], include_timings: Optional[bool] = None, deadline: Optional[float] = None) -> Dict:
+    """Price a checkout cart; routed to the interactive queue.
+
+    `deadline` (epoch seconds) bounds the work: items not finished by then are
+    returned with `unfinished: True` and the response gets `partial: True`.
+    """
+    with priority_scope(INTERACTIVE), deadline_scope(deadline):
+        return _process_cart(cart_id, community_id, product_names, include_timings)
+
+@celery_app.task(name="agent.process_products_bulk", bind=True)
+def process_products_bulk_task(self, cart_id: str, community_id: str, product_names: List[dict], include_timings: Optional[bool] = None, deadline: Optional[float] = None) -> Dict:
+    """Same as `process_products_task` for batch re-pricing; routed to the bulk queue.
+
+    Its LLM calls leave the interactive reserve of the shared budget untouched.
+    Nothing in this repository enqueues it yet: a re-pricing job submits carts
+    with `process_products_bulk_task.delay(cart_id, community_id, product_names)`.
+    """
+    with priority_scope(BULK), deadline_scope(deadline):
+        return _process_cart(cart_id, community_id, product_names, include_timings)
+
+def _process_cart(cart_id, community_id, product_names, include_timings):
+    include_timings = INCLUDE_TIMINGS if include_timings is None else include_timings
+
+    with collect_spans() as cart_spans:
+        with stage("catalog_load"):
+            agent1 = get_product_agent()
+        # Resolved before any retrieval: the resolver only moves forward, so this
+        # cart's lookups read this class or a newer one, never an older one.
+        subsidy_version = result_cache.subsidy_index_version(resolve_weaviate_class())
+        # Agent2 retrieves its context on first use, so all-hit carts skip Weaviate;
+        # the cached agent reuses it for later carts of the same community.
+        agent2 = get_community_agent(community_id, subsidy_version)
 
     results: List[Dict] = []
 
     for product_dict in product_names:   # product_names = [ { "item1": "...", "item2": "..." } ]
         if isinstance(product_dict, dict):
             for cart_item_id, product_name in product_dict.items():
-                result = _process_single(agent1, agent2, community_id, cart_item_id, product_name)
+                with collect_spans() as item_spans:
+                    result = _process_cached(agent1, agent2, community_id, cart_item_id, product_name, subsidy_version)
+                if include_timings:
+                    result["timings_ms"] = item_spans
                 results.append(result)
         else:
             raise ValueError(f"Expected dict inside product_names, got {type(product_dict)}: {product_dict}")
 
-    return {
+    response = {
         "cart_id": cart_id,
         "products": results   
     }
+    if any(r.get("unfinished") for r in results):
+        response["partial"] = True
+    if include_timings:
+        response["timings_ms"] = cart_spans
+    return to_columnar(response) if COLUMNAR_RESULTS else response
+
+def _process_cached(agent1, agent2, community_id, cart_item_id, product_name, subsidy_version):
+    """Serve an item from the result cache, computing and storing it on a miss.
+
+    Adds a `cache` field to the result: "local", "redis", "miss" or "bypass".
+    """
+    key = result_cache.result_key(community_id, product_name, agent1.catalog_version, subsidy_version)
+    if key is None:
+        result = _process_single(agent1, agent2, community_id, cart_item_id, product_name)
+        result["cache"] = "bypass"
+        return result
+
+    with stage("result_cache"):
+        cached, status = result_cache.lookup(key)
+    if cached is not None:
+        return {
+            **cached,
+            "product_name": product_name,
+            "community_id": community_id,
+            "cart_item_id": cart_item_id,
+            "cache": status,
+        }
+
+    result = _process_single(agent1, agent2, community_id, cart_item_id, product_name)
+    if result_cache.is_cacheable(result):
+        result_cache.store(key, result)
+    result["cache"] = "miss"
+    return result
+
+def _unfinished(community_id, cart_item_id, product_name, product_state=None):
+    """Placeholder for an item the deadline cut short; never cached."""
+    product_state = product_state or {}
+    return {
+        "product_name": product_name,
+        "product_code": product_state.get("product_code"),
+        "subsidy_level": product_state.get("subsidy_level"),
+        "community_id": community_id,
+        "discount_per_kg": None,
+        "cart_item_id": cart_item_id,
+        "unfinished": True,
+    }
 
 def _process_single(agent1, agent2, community_id, cart_item_id, product_name):
-    product_state = agent1.extract_product_details(product_name)
+    if expired():
+        return _unfinished(community_id, cart_item_id, product_name)
+
+    with stage("product_match"):
+        product_state = agent1.extract_product_details(product_name)
 
     if not product_state.get("subsidy_level"):
         return {
@@ -83,7 +175,10 @@ def _process_single(agent1, agent2, community_id, cart_item_id, product_name):
         }
 
     try:
-        result = agent2.run(product_state)
+        with stage("discount_extraction"):
+            result = agent2.run(product_state)
+    except DeadlineExceeded:
+        return _unfinished(community_id, cart_item_id, product_name, product_state)
     except Exception:
         result = None
 
@@ -93,7 +188,7 @@ def _process_single(agent1, agent2, community_id, cart_item_id, product_name):
             "product_code": product_state.get("product_code"),
             "subsidy_level": product_state.get("subsidy_level"),
             "community_id": community_id,
-            "discount_per_kg": none,
+            "discount_per_kg": None,
             "cart_item_id": cart_item_id
         }
     else:
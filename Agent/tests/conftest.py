@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# Agent modules import each other as top-level modules (`from shared import ...`).
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
@@ -0,0 +1,57 @@
+import pytest
+
+from serialization import COLUMNAR_FORMAT, from_columnar, to_columnar
+
+
+def round_trip(products):
+    result = {"cart_id": "c1", "products": products}
+    packed = to_columnar(result)
+    assert packed["products"]["format"] == COLUMNAR_FORMAT
+    restored = from_columnar(packed)
+    assert restored == result
+    for before, after in zip(products, restored["products"]):
+        assert list(after) == list(before)
+        for field, value in before.items():
+            assert type(after[field]) is type(value), field
+    return packed
+
+
+def test_constant_fields_are_stored_once():
+    packed = round_trip([
+        {"product_name": "milk", "community_id": "NU-IQ-01", "score": 90.0},
+        {"product_name": "bread", "community_id": "NU-IQ-01", "score": 85.0},
+    ])
+    assert packed["products"]["constants"] == {"community_id": "NU-IQ-01"}
+    assert "community_id" not in packed["products"]["columns"]
+
+
+@pytest.mark.parametrize("values", [
+    [0, False],
+    [1, 1.0, True],
+    [None, 0],
+    ["1", 1],
+    [{"llm": 1}, {"llm": 1.0}],
+    [[0], [False]],
+])
+def test_equal_values_of_different_types_are_not_merged(values):
+    packed = round_trip([{"value": v} for v in values])
+    assert packed["products"]["constants"] == {}
+
+
+def test_missing_fields_stay_missing():
+    round_trip([
+        {"product_name": "milk", "timings_ms": {"llm": 12.5}},
+        {"product_name": "bread"},
+        {"product_name": "eggs", "unfinished": True},
+    ])
+
+
+@pytest.mark.parametrize("products", [[], [{"product_name": "milk", "score": 0}]])
+def test_empty_and_single_item_carts(products):
+    round_trip(products)
+
+
+def test_non_columnar_results_pass_through():
+    legacy = {"cart_id": "c1", "products": [{"product_name": "milk"}]}
+    assert from_columnar(legacy) is legacy
+    assert from_columnar(None) is None
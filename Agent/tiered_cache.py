@@ -0,0 +1,157 @@
+"""Two-tier cache: an in-process LRU in front of a shared Redis tier.
+
+Values must be JSON-serializable. Redis errors never fail the caller: the
+Redis tier is skipped for REDIS_RETRY_SECONDS after an error and the local
+tier keeps serving.
+
+Data versions (e.g. the subsidy index) are small counters in Redis that
+ingestion jobs bump with `bump_data_version`. Callers put the version in their
+cache keys, so a re-ingest invalidates every dependent entry without a scan.
+Unlike the cache tiers, versions fail closed: `get_data_version` returns None
+while Redis is unavailable and callers skip caching, since a bump made in the
+meantime could not reach them. `bump_data_version` raises `DataVersionError`,
+so the job doing the bump reports that nothing was invalidated.
+
+Environment variables:
+- AGENT_CACHE_REDIS_URL (default redis://localhost:6379/2; empty disables Redis)
+"""
+
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional, Tuple
+
+try:
+    import redis
+except ImportError:  # local tier only
+    redis = None
+
+from metrics import record_cache
+
+AGENT_CACHE_REDIS_URL = os.getenv("AGENT_CACHE_REDIS_URL", "redis://localhost:6379/2")
+REDIS_RETRY_SECONDS = 30.0
+KEY_PREFIX = "agent"
+
+_redis_client = None
+_redis_down_until = 0.0
+_redis_lock = threading.Lock()
+
+
+def get_redis():
+    """Return the shared Redis client, or None while Redis is unavailable."""
+    global _redis_client
+    if redis is None or not AGENT_CACHE_REDIS_URL or time.time() < _redis_down_until:
+        return None
+    if _redis_client is None:
+        with _redis_lock:
+            if _redis_client is None:
+                _redis_client = redis.Redis.from_url(
+                    AGENT_CACHE_REDIS_URL, socket_timeout=0.25, socket_connect_timeout=0.25
+                )
+    return _redis_client
+
+
+def mark_redis_down(err: Exception) -> None:
+    global _redis_down_until
+    if time.time() >= _redis_down_until:
+        print(f"Cache Redis unavailable at {AGENT_CACHE_REDIS_URL}: {err}")
+    _redis_down_until = time.time() + REDIS_RETRY_SECONDS
+
+
+class DataVersionError(RuntimeError):
+    """A data version could not be bumped, so caches keyed on it were not invalidated."""
+
+
+def get_data_version(name: str) -> Optional[str]:
+    """Current version counter for data source `name` ("0" if never bumped, None if Redis is unavailable)."""
+    client = get_redis()
+    if client is None:
+        return None
+    try:
+        value = client.get(f"{KEY_PREFIX}:version:{name}")
+    except Exception as e:
+        mark_redis_down(e)
+        return None
+    return value.decode() if value else "0"
+
+
+def bump_data_version(name: str) -> str:
+    """Advance the version of `name`, invalidating caches keyed on it; raises DataVersionError on failure."""
+    client = get_redis()
+    if client is None:
+        raise DataVersionError(
+            f"Cannot bump data version '{name}': cache Redis ({AGENT_CACHE_REDIS_URL or 'disabled'}) is unavailable; "
+            "cached results were NOT invalidated"
+        )
+    try:
+        return str(client.incr(f"{KEY_PREFIX}:version:{name}"))
+    except Exception as e:
+        mark_redis_down(e)
+        raise DataVersionError(
+            f"Cannot bump data version '{name}': {e}; cached results were NOT invalidated"
+        ) from e
+
+
+class TieredCache:
+    """Local LRU (`maxsize` entries, `local_ttl` seconds) over Redis (`ttl` seconds)."""
+
+    def __init__(self, name: str, maxsize: int = 10000, ttl: int = 86400, local_ttl: float = 300.0):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.local_ttl = local_ttl
+        self._local: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _redis_key(self, key: str) -> str:
+        return f"{KEY_PREFIX}:{self.name}:{key}"
+
+    def get(self, key: str) -> Tuple[Optional[Any], str]:
+        """Return `(value, status)`; status is "local", "redis" or "miss"."""
+        now = time.time()
+        with self._lock:
+            entry = self._local.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._local.move_to_end(key)
+                    record_cache(self.name, "hit_local")
+                    return entry[1], "local"
+                del self._local[key]
+
+        client = get_redis()
+        if client is not None:
+            try:
+                raw = client.get(self._redis_key(key))
+            except Exception as e:
+                mark_redis_down(e)
+                raw = None
+            if raw is not None:
+                value = json.loads(raw)
+                self._set_local(key, value)
+                record_cache(self.name, "hit_redis")
+                return value, "redis"
+
+        record_cache(self.name, "miss")
+        return None, "miss"
+
+    def set(self, key: str, value: Any) -> None:
+        self._set_local(key, value)
+        client = get_redis()
+        if client is not None:
+            try:
+                client.set(self._redis_key(key), json.dumps(value), ex=self.ttl)
+            except Exception as e:
+                mark_redis_down(e)
+
+    def _set_local(self, key: str, value: Any) -> None:
+        with self._lock:
+            self._local[key] = (time.time() + self.local_ttl, value)
+            self._local.move_to_end(key)
+            while len(self._local) > self.maxsize:
+                self._local.popitem(last=False)
+
+    def clear_local(self) -> None:
+        with self._lock:
+            self._local.clear()
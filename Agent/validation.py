@@ -1,26 +1,69 @@
+"""Delivery address validation against the customer's community.
+
+`validate_and_trigger_agents` geocodes one address with a blocking request
+and checks the resolved community against the one the customer gave.
+`validate_addresses_bulk` does the same for a batch: identical addresses are
+geocoded once, concurrently, through one `httpx.AsyncClient` per batch. Per
+geocoding provider, a semaphore bounds requests in flight and a limiter
+spaces them to the provider's rate. Results are yielded as soon as each
+address resolves, in completion order. A batch runs for at most
+VALIDATION_BULK_MAX_SECONDS; addresses still unresolved then are reported
+with status "error" rather than holding the stream open (10000 distinct
+addresses at 5 per second would take over half an hour).
+
+The concurrency and rate limits live in the event loop that runs the batch,
+so each API worker process has its own. With N uvicorn/gunicorn workers the
+provider sees up to N times GEOCODER_CONCURRENCY and GEOCODER_RATE_PER_SECOND:
+set both to the provider's limit divided by the worker count.
+
+Point GEOCODER_BASE_URL at `benchmarks.fake_geocoder` to run without Geoapify.
+
+Environment variables:
+- GEOAPIFY_API_KEY
+- GEOCODER_BASE_URL (default https://api.geoapify.com)
+- GEOCODER_CONCURRENCY (default 8 requests in flight per provider)
+- GEOCODER_RATE_PER_SECOND (default 5 per provider; 0 disables the limiter)
+- GEOCODER_TIMEOUT_SECONDS (default 10)
+- GEOCODER_MAX_RETRIES (default 2; for 429 and 5xx responses)
+- GEOCODER_MAX_RETRY_AFTER_SECONDS (default 30; longer Retry-After headers are capped)
+- VALIDATION_BULK_MAX_ITEMS (default 10000 pairs per batch)
+- VALIDATION_BULK_MAX_SECONDS (default 300)
+"""
+
+import asyncio
+import os
+import time
+import weakref
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+import httpx
 import requests
-from geopy.distance import geodesic
 
-GEOAPIFY_API_KEY = "ec2edb750eda45ceac3c932cd942c80a"
+from metrics import record_retry
 
-def geocode_address(address: str):
-    url = f"https://api.geoapify.com/v1/geocode/search?text={address}&apiKey={GEOAPIFY_API_KEY}"
-    response = requests.get(url)
-    response.raise_for_status()
-    data = response.json()
+GEOAPIFY_API_KEY = os.getenv("GEOAPIFY_API_KEY", "ec2edb750eda45ceac3c932cd942c80a")
+GEOCODER_BASE_URL = os.getenv("GEOCODER_BASE_URL", "https://api.geoapify.com").rstrip("/")
+GEOCODER_CONCURRENCY = int(os.getenv("GEOCODER_CONCURRENCY", "8"))
+GEOCODER_RATE_PER_SECOND = float(os.getenv("GEOCODER_RATE_PER_SECOND", "5"))
+GEOCODER_TIMEOUT_SECONDS = float(os.getenv("GEOCODER_TIMEOUT_SECONDS", "10"))
+GEOCODER_MAX_RETRIES = int(os.getenv("GEOCODER_MAX_RETRIES", "2"))
+GEOCODER_MAX_RETRY_AFTER_SECONDS = float(os.getenv("GEOCODER_MAX_RETRY_AFTER_SECONDS", "30"))
+VALIDATION_BULK_MAX_ITEMS = int(os.getenv("VALIDATION_BULK_MAX_ITEMS", "10000"))
+VALIDATION_BULK_MAX_SECONDS = float(os.getenv("VALIDATION_BULK_MAX_SECONDS", "300"))
 
-    if not data["features"]:
-        raise ValueError("Could not geocode the address")
+_RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+def _geocode_request(address: str) -> Tuple[str, Dict[str, str]]:
+    return f"{GEOCODER_BASE_URL}/v1/geocode/search", {"text": address, "apiKey": GEOAPIFY_API_KEY}
 
-    feature = data["features"][0]
-    props = feature["properties"]
 
-    print("Geoapify geocode response:", props)
+def parse_geocode_response(data: dict) -> dict:
+    if not data.get("features"):
+        raise ValueError("Could not geocode the address")
 
-    lat = feature["geometry"]["coordinates"][1]
-    lon = feature["geometry"]["coordinates"][0]
-    postcode = props.get("postcode") or props.get("postal_code") or ""
-    postcode = postcode.upper()
+    props = data["features"][0]["properties"]
     community = (
         props.get("city")
         or props.get("county")
@@ -36,6 +79,36 @@ def geocode_address(address: str):
         "resolved_community": community.strip()
     }
 
+
+def geocode_address(address: str):
+    url, params = _geocode_request(address)
+    response = requests.get(url, params=params, timeout=GEOCODER_TIMEOUT_SECONDS)
+    response.raise_for_status()
+    data = response.json()
+
+    if data.get("features"):
+        print("Geoapify geocode response:", data["features"][0]["properties"])
+
+    return parse_geocode_response(data)
+
+
+def match_community(resolved_community_name: str, input_community_name: str) -> dict:
+    # Normalize both names and check for substring match in either direction
+    resolved = resolved_community_name.lower()
+    input_name = input_community_name.lower()
+
+    if input_name in resolved or resolved in input_name:
+        return {
+            "status": "success",
+            "message": f"Address matched with community '{resolved_community_name}'"
+        }
+    else:
+        return {
+            "status": "failed",
+            "reason": f"Address does not match the given community name. Expected '{input_community_name}', but found '{resolved_community_name}'."
+        }
+
+
 def validate_and_trigger_agents(address: str, input_community_name: str):
     try:
         geo_info = geocode_address(address)
@@ -44,20 +117,119 @@ def validate_and_trigger_agents(address: str, input_community_name: str):
         print(f"Geo-resolved community: {resolved_community_name}")
         print(f"Input community name: {input_community_name}")
 
-        # Normalize both names and check for substring match in either direction
-        resolved = resolved_community_name.lower()
-        input_name = input_community_name.lower()
-
-        if input_name in resolved or resolved in input_name:
-            return {
-                "status": "success",
-                "message": f"Address matched with community '{resolved_community_name}'"
-            }
-        else:
-            return {
-                "status": "failed",
-                "reason": f"Address does not match the given community name. Expected '{input_community_name}', but found '{resolved_community_name}'."
-            }
+        return match_community(resolved_community_name, input_community_name)
 
     except Exception as e:
-        return {"status": "error", "message": str(e)}
\ No newline at end of file
+        return {"status": "error", "message": str(e)}
+
+
+class AsyncRateLimiter:
+    """Spaces calls at least 1/`rate` seconds apart across all tasks on the loop."""
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._next_at = 0.0
+        self._lock = asyncio.Lock()
+
+    async def wait(self) -> None:
+        if not self.interval:
+            return
+        async with self._lock:
+            now = time.monotonic()
+            delay = self._next_at - now
+            self._next_at = max(now, self._next_at) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+# Per event loop, keyed by provider host: every bulk request served by the loop shares one budget per provider
+# (but each worker process has its own loop, see the module docstring).
+_provider_limits: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, Tuple[asyncio.Semaphore, AsyncRateLimiter]]]" = weakref.WeakKeyDictionary()
+
+
+def _limits_for(url: str) -> Tuple[asyncio.Semaphore, AsyncRateLimiter]:
+    limits = _provider_limits.setdefault(asyncio.get_running_loop(), {})
+    provider = urlsplit(url).netloc
+    if provider not in limits:
+        limits[provider] = (asyncio.Semaphore(GEOCODER_CONCURRENCY), AsyncRateLimiter(GEOCODER_RATE_PER_SECOND))
+    return limits[provider]
+
+
+def _retry_after(response: httpx.Response, attempt: int) -> float:
+    try:
+        delay = float(response.headers["Retry-After"])
+    except (KeyError, ValueError):
+        delay = 0.5 * 2 ** attempt
+    return min(max(delay, 0.0), GEOCODER_MAX_RETRY_AFTER_SECONDS)
+
+
+async def geocode_address_async(client: httpx.AsyncClient, address: str) -> dict:
+    url, params = _geocode_request(address)
+    semaphore, limiter = _limits_for(url)
+    for attempt in range(GEOCODER_MAX_RETRIES + 1):
+        async with semaphore:
+            await limiter.wait()
+            response = await client.get(url, params=params)
+        if response.status_code not in _RETRY_STATUSES or attempt == GEOCODER_MAX_RETRIES:
+            break
+        record_retry("geocode")
+        await asyncio.sleep(_retry_after(response, attempt))
+    response.raise_for_status()
+    return parse_geocode_response(response.json())
+
+
+def _address_key(address: str) -> str:
+    return " ".join(address.lower().split())
+
+
+async def validate_addresses_bulk(items: List[Tuple[str, str]], client: Optional[httpx.AsyncClient] = None) -> AsyncIterator[dict]:
+    """Validate `(address, community_name)` pairs, yielding each result as its address resolves.
+
+    Each result carries the pair's `index` in `items`, its `address` and
+    `community_name`, and the same fields `validate_and_trigger_agents`
+    returns. Addresses equal up to case and whitespace are geocoded once.
+    Pairs not resolved within VALIDATION_BULK_MAX_SECONDS get status "error".
+    """
+    by_address: Dict[str, List[int]] = {}
+    for idx, (address, _) in enumerate(items):
+        by_address.setdefault(_address_key(address), []).append(idx)
+
+    own_client = client is None
+    if own_client:
+        client = httpx.AsyncClient(
+            timeout=GEOCODER_TIMEOUT_SECONDS,
+            limits=httpx.Limits(max_connections=GEOCODER_CONCURRENCY),
+        )
+
+    async def resolve(indices: List[int]) -> Tuple[List[int], Optional[dict], Optional[str]]:
+        try:
+            return indices, await geocode_address_async(client, items[indices[0]][0]), None
+        except Exception as e:
+            return indices, None, str(e) or type(e).__name__
+
+    pending = [asyncio.ensure_future(resolve(indices)) for indices in by_address.values()]
+    unresolved = set(range(len(items)))
+    try:
+        try:
+            for done in asyncio.as_completed(pending, timeout=VALIDATION_BULK_MAX_SECONDS):
+                indices, geo_info, error = await done
+                for idx in indices:
+                    address, community_name = items[idx]
+                    if error is not None:
+                        result = {"status": "error", "message": error}
+                    else:
+                        result = match_community(geo_info["resolved_community"], community_name)
+                    unresolved.discard(idx)
+                    yield {"index": idx, "address": address, "community_name": community_name, **result}
+        except asyncio.TimeoutError:
+            message = f"Not geocoded within the batch limit of {VALIDATION_BULK_MAX_SECONDS:g}s"
+            for idx in sorted(unresolved):
+                address, community_name = items[idx]
+                yield {"index": idx, "address": address, "community_name": community_name,
+                       "status": "error", "message": message}
+    finally:
+        # The client went away mid-stream: stop geocoding for it.
+        for task in pending:
+            task.cancel()
+        if own_client:
+            await client.aclose()
@@ -1,6 +1,12 @@
 import os
 import re
+import sys
+import time
+import argparse
+import multiprocessing
+import random
 import boto3
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
 from io import BytesIO
 from dotenv import load_dotenv, find_dotenv
 from PyPDF2 import PdfReader
@@ -11,16 +17,34 @@ from langchain_huggingface import HuggingFaceEmbeddings  # updated import
 from langchain.docstore.document import Document
 from weaviate.auth import AuthApiKey
 from weaviate import Client as V3Client
+from index_alias import garbage_collect, read_alias, set_alias, versioned_class_name
+from tiered_cache import bump_data_version
+from weaviate_schema import ensure_chunk_class
 
 """Vector ingestion utilities for PDF content into Weaviate.
 
 This module extracts semantically meaningful chunks from a PDF, augments them
 with recursive text splitting, embeds with a HuggingFace model, and ingests the
 vectors and metadata into a Weaviate cluster.
+
+With `--prefix`, every PDF under an S3 prefix is ingested in one run: objects
+are downloaded on a thread pool, parsed and chunked on a process pool, and all
+chunks share one batched embedding stage. Set S3_ENDPOINT_URL to point boto3
+at a local stand-in, e.g. `moto_server -p 5000` or MinIO.
 """
 
 load_dotenv(find_dotenv())
 
+# Agent2 retrieves by community ID ("ON-NON-ATT"), so a freshly built class is
+# validated with IDs sampled from the chunks just ingested.
+COMMUNITY_ID_PATTERN = re.compile(r"\b[A-Z]{2}-[A-Z]{2,4}-[A-Z0-9]{2,4}\b")
+VALIDATION_SAMPLE_SIZE = int(os.getenv("VALIDATION_SAMPLE_SIZE", "10"))
+VALIDATION_TOP_K = 20  # Agent2.get_relevant_context's top_k
+# Parallel batch workers; a blue/green build serves no reads, so it can go flat out.
+WEAVIATE_BATCH_WORKERS = int(os.getenv("WEAVIATE_BATCH_WORKERS", "4"))
+S3_ENDPOINT_URL = os.getenv("S3_ENDPOINT_URL") or None
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "128"))
+
 def extract_semantic_chunks_with_metadata(pdf_stream):
     """Parse a PDF stream into category/code-aware text chunks.
 
@@ -75,98 +99,375 @@ def extract_semantic_chunks_with_metadata(pdf_stream):
 
     return chunks
 
-def generate_vectorstore():
-    """Create embeddings for PDF content and ingest into Weaviate.
+def get_s3_client():
+    return boto3.client("s3", endpoint_url=S3_ENDPOINT_URL)
 
-    - Downloads a PDF from S3 specified by environment variables `BUCKET_NAME`
-      and `OBJECT_KEY`.
-    - Extracts semantic and recursively split chunks.
-    - Embeds chunk texts using `sentence-transformers/all-mpnet-base-v2`.
-    - Ensures the Weaviate class exists and batches ingestion with attached
-      vectors.
-    """
-    bucket_name = os.getenv("BUCKET_NAME")
-    object_key = os.getenv("OBJECT_KEY")
-    print("Loaded OBJECT_KEY:", object_key)
 
-    s3 = boto3.client("s3")
-    pdf_stream = BytesIO()
-    s3.download_fileobj(bucket_name, object_key, pdf_stream)
-    pdf_stream.seek(0)
+def list_pdf_objects(s3, bucket_name, prefix):
+    """Return the keys of all PDFs under `prefix`, following pagination."""
+    keys = []
+    paginator = s3.get_paginator("list_objects_v2")
+    for page in paginator.paginate(Bucket=bucket_name, Prefix=prefix):
+        for obj in page.get("Contents", []):
+            if obj["Key"].lower().endswith(".pdf"):
+                keys.append(obj["Key"])
+    return keys
 
-    with NamedTemporaryFile(delete=False, suffix=".pdf") as tmp_pdf:
-        tmp_pdf.write(pdf_stream.read())
-        tmp_pdf_path = tmp_pdf.name
 
-    pdf_stream.seek(0)
+def download_object(s3, bucket_name, object_key):
+    stream = BytesIO()
+    s3.download_fileobj(bucket_name, object_key, stream)
+    return stream.getvalue()
+
 
-    pdf_loader = PyPDFLoader(file_path=tmp_pdf_path)
-    pdf_pages = pdf_loader.load()
-    print(f"Loaded {len(pdf_pages)} PDF pages")
+def chunk_pdf(object_key, data):
+    """Split one PDF into semantic and recursive chunks tagged with `source_object`.
 
-    semantic_chunks = extract_semantic_chunks_with_metadata(pdf_stream)
+    Runs in a worker process during prefix ingestion, so it only takes and
+    returns picklable values.
+    """
+    with NamedTemporaryFile(delete=False, suffix=".pdf") as tmp_pdf:
+        tmp_pdf.write(data)
+        tmp_pdf_path = tmp_pdf.name
+    try:
+        pdf_pages = PyPDFLoader(file_path=tmp_pdf_path).load()
+    finally:
+        os.unlink(tmp_pdf_path)
+
+    semantic_chunks = extract_semantic_chunks_with_metadata(BytesIO(data))
 
     splitter = RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=100)
     recursive_chunks = splitter.split_documents(pdf_pages)
 
+    for doc in semantic_chunks:
+        doc.metadata["source"] = "semantic"
     for i, doc in enumerate(recursive_chunks):
         doc.metadata = {**doc.metadata, "source": "recursive", "recursive_idx": i}
 
     chunks = semantic_chunks + recursive_chunks
-    if not chunks:
-        raise ValueError("No extractable content found in PDF.")
-    print(f"Total Chunks: {len(chunks)}")
+    for doc in chunks:
+        doc.metadata["source_object"] = object_key
+    return len(pdf_pages), chunks
+
+
+def ingest_chunks(client, class_name, chunks, vectors, ingestion_version, num_workers=1):
+    """Batch-insert `chunks` with their precomputed `vectors` into `class_name`.
+
+    Returns the number of failed objects per `source_object`.
+    """
+    failed = {}
+
+    def _count_errors(results):
+        for result in results or []:
+            if result.get("result", {}).get("errors"):
+                key = (result.get("properties") or {}).get("source_object")
+                failed[key] = failed.get(key, 0) + 1
+
+    client.batch.configure(batch_size=64, num_workers=num_workers, callback=_count_errors)
+    with client.batch as batch:
+        for doc, vector in zip(chunks, vectors):
+            metadata = doc.metadata
+            props = {
+                "text": doc.page_content,
+                "page": int(metadata.get("page") or 0),
+                "product_code": metadata.get("product_code"),
+                "category": metadata.get("category"),
+                "source": metadata.get("source", "recursive"),
+                "recursive_idx": int(metadata.get("recursive_idx") or 0),
+                "source_object": metadata.get("source_object"),
+                "ingestion_version": ingestion_version,
+            }
+            batch.add_data_object(data_object=props, class_name=class_name, vector=vector)
+    return failed
+
+
+def community_ids_in_class(client, class_name, limit=1000):
+    """Community IDs found in up to `limit` chunk texts of `class_name`."""
+    resp = client.data_object.get(class_name=class_name, limit=limit)
+    ids = set()
+    for obj in resp.get("objects") or []:
+        ids.update(COMMUNITY_ID_PATTERN.findall((obj.get("properties") or {}).get("text") or ""))
+    return ids
+
+
+def sample_community_ids(ids, size=VALIDATION_SAMPLE_SIZE):
+    ids = sorted(ids)
+    return ids if len(ids) <= size else sorted(random.Random(0).sample(ids, size))
+
+
+def validate_index(client, class_name, embedding_model, community_ids, expected_count):
+    """Check a built class before it serves reads; returns a list of problems.
+
+    The class must hold `expected_count` objects, and for every community ID
+    the top VALIDATION_TOP_K vector and BM25 results, which is what Agent2
+    retrieves, must include a chunk that mentions that ID.
+    """
+    problems = []
+    resp = client.query.aggregate(class_name).with_meta_count().do()
+    groups = resp.get("data", {}).get("Aggregate", {}).get(class_name) or [{}]
+    count = groups[0].get("meta", {}).get("count", 0)
+    if count != expected_count:
+        problems.append(f"object count {count} != expected {expected_count}")
+
+    if not community_ids:
+        problems.append("no community IDs to validate retrieval with")
+    for community_id in community_ids:
+        vector = embedding_model.embed_query(community_id)
+        near = client.query.get(class_name, ["text"]).with_near_vector({"vector": vector}).with_limit(VALIDATION_TOP_K).do()
+        bm25 = client.query.get(class_name, ["text"]).with_bm25(query=community_id).with_limit(VALIDATION_TOP_K).do()
+        hits = (near.get("data", {}).get("Get", {}).get(class_name) or []) + \
+            (bm25.get("data", {}).get("Get", {}).get(class_name) or [])
+        if not any(community_id in (hit.get("text") or "") for hit in hits):
+            problems.append(f"no chunk for community {community_id!r} in the top {VALIDATION_TOP_K} results")
+    return problems
+
+
+class IngestionReport:
+    """Per-document progress and failures for one ingestion run."""
+
+    def __init__(self, keys):
+        self.keys = list(keys)
+        self.status = {key: "pending" for key in self.keys}
+        self.chunks = {}
+        self.pending_chunks = {}
+        self.errors = {}
+        self.community_ids = set()
+
+    def _log(self, key, message):
+        done = sum(1 for status in self.status.values() if status in ("ingested", "failed"))
+        print(f"[{done}/{len(self.keys)}] {key}: {message}")
+
+    def downloaded(self, key, size):
+        self.status[key] = "downloaded"
+        self._log(key, f"downloaded {size / 1024:.0f} KiB")
+
+    def parsed(self, key, pages, chunk_count):
+        self.status[key] = "parsed"
+        self.chunks[key] = chunk_count
+        self.pending_chunks[key] = chunk_count
+        self._log(key, f"{pages} pages -> {chunk_count} chunks")
+        if chunk_count == 0:
+            self.fail(key, "no extractable content")
+
+    def embedded(self, key, count, failed=0):
+        if failed:
+            self.errors[key] = f"{failed} objects rejected by Weaviate"
+        self.pending_chunks[key] -= count
+        if self.pending_chunks[key] <= 0 and self.status[key] == "parsed":
+            if key in self.errors:
+                self.fail(key, self.errors[key])
+            else:
+                self.status[key] = "ingested"
+                self._log(key, f"ingested {self.chunks[key]} chunks")
+
+    def fail(self, key, error):
+        self.status[key] = "failed"
+        self.errors[key] = str(error)
+        self._log(key, f"FAILED: {error}")
+
+    @property
+    def failed(self):
+        return [key for key in self.keys if self.status[key] == "failed"]
+
+    @property
+    def ingested_chunks(self):
+        return sum(self.chunks.get(key, 0) for key in self.keys if self.status[key] == "ingested")
+
+    def summary(self):
+        lines = [f"Ingested {len(self.keys) - len(self.failed)}/{len(self.keys)} documents, {self.ingested_chunks} chunks"]
+        lines += [f"  failed {key}: {self.errors[key]}" for key in self.failed]
+        return "\n".join(lines)
+
+
+def ingest_documents(s3, bucket_name, keys, embedding_model, client, class_name, ingestion_version,
+                     download_workers=8, parse_workers=None, embed_batch_size=EMBED_BATCH_SIZE, num_workers=1):
+    """Download, chunk, embed and ingest `keys`, overlapping all stages.
+
+    Downloads run on a thread pool and parsing on a process pool; chunks from
+    finished documents are embedded and written in shared batches of
+    `embed_batch_size` while later documents are still in flight. A failing
+    document is reported and skipped without stopping the run.
+    """
+    report = IngestionReport(keys)
+    buffer = []
+
+    def flush(batch):
+        for doc in batch:
+            report.community_ids.update(COMMUNITY_ID_PATTERN.findall(doc.page_content))
+        vectors = embedding_model.embed_documents([doc.page_content for doc in batch])
+        failed = ingest_chunks(client, class_name, batch, vectors, ingestion_version, num_workers=num_workers)
+        per_doc = {}
+        for doc in batch:
+            key = doc.metadata["source_object"]
+            per_doc[key] = per_doc.get(key, 0) + 1
+        for key, count in per_doc.items():
+            report.embedded(key, count, failed.get(key, 0))
+
+    # Spawned workers do not inherit the embedding model or client threads.
+    mp_context = multiprocessing.get_context("spawn")
+    with ThreadPoolExecutor(max_workers=download_workers) as downloads, \
+            ProcessPoolExecutor(max_workers=parse_workers, mp_context=mp_context) as parsers:
+        in_flight = {downloads.submit(download_object, s3, bucket_name, key): ("download", key) for key in keys}
+        while in_flight:
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                step, key = in_flight.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    report.fail(key, f"{step} error: {e}")
+                    continue
+                if step == "download":
+                    report.downloaded(key, len(result))
+                    in_flight[parsers.submit(chunk_pdf, key, result)] = ("parse", key)
+                else:
+                    pages, chunks = result
+                    report.parsed(key, pages, len(chunks))
+                    buffer.extend(chunks)
+            while len(buffer) >= embed_batch_size:
+                flush(buffer[:embed_batch_size])
+                del buffer[:embed_batch_size]
+        if buffer:
+            flush(buffer)
+    return report
+
+
+def generate_vectorstore(blue_green=False, keep_versions=2, validation_ids=None, prefix=None,
+                         download_workers=8, parse_workers=None):
+    """Create embeddings for PDF content and ingest into Weaviate.
+
+    - Downloads the PDF at `BUCKET_NAME`/`OBJECT_KEY` from S3, or with
+      `prefix` every PDF under that prefix of `BUCKET_NAME`.
+    - Extracts semantic and recursively split chunks.
+    - Embeds chunk texts using `sentence-transformers/all-mpnet-base-v2`.
+    - Ensures the Weaviate class exists and batches ingestion with attached
+      vectors, tagging each chunk with its `source_object` and
+      `ingestion_version` (INGESTION_VERSION or a timestamp).
+
+    With `blue_green`, WEAVIATE_CLASS_NAME is treated as an alias: chunks go
+    into a new versioned class while the current one keeps serving, the new
+    class must pass `validate_index` for `validation_ids` (by default a sample
+    of the community IDs in the ingested chunks, or failing that in the class
+    currently serving), then the alias is repointed and all but
+    the newest `keep_versions` versions are dropped. A build that fails
+    validation, or in which any document failed, is dropped and the alias is
+    left unchanged.
+
+    Returns the `IngestionReport` of the run.
+    """
+    bucket_name = os.getenv("BUCKET_NAME")
+    s3 = get_s3_client()
+    if prefix is not None:
+        keys = list_pdf_objects(s3, bucket_name, prefix)
+        print(f"Found {len(keys)} PDFs under s3://{bucket_name}/{prefix}")
+    else:
+        keys = [os.getenv("OBJECT_KEY")]
+        print("Loaded OBJECT_KEY:", keys[0])
+    if not keys:
+        raise ValueError(f"No PDFs found under s3://{bucket_name}/{prefix}")
+
+    # Lets weaviate_cleanup.py delete this document or this run selectively.
+    ingestion_version = os.getenv("INGESTION_VERSION") or time.strftime("%Y%m%dT%H%M%S")
 
     embedding_model = HuggingFaceEmbeddings(model_name="sentence-transformers/all-mpnet-base-v2")
 
     weaviate_host = os.getenv("WEAVIATE_HOST", "http://localhost:8080")
     weaviate_api_key = os.getenv("WEAVIATE_API_KEY") or None
-    class_name = os.getenv("WEAVIATE_CLASS_NAME", "ProductChunk")
+    alias = os.getenv("WEAVIATE_CLASS_NAME", "ProductChunk")
 
     if weaviate_api_key:
         client = V3Client(url=weaviate_host, auth_client_secret=AuthApiKey(weaviate_api_key))
     else:
         client = V3Client(url=weaviate_host)
 
+    if blue_green:
+        class_name = versioned_class_name(alias, ingestion_version)
+        current = read_alias(client, alias) or alias
+        if class_name == current:
+            raise ValueError(f"Class '{class_name}' is serving reads; use a new INGESTION_VERSION.")
+        if any(c.get("class") == class_name for c in client.schema.get().get("classes", [])):
+            print(f"Dropping leftover class '{class_name}' from an earlier attempt")
+            client.schema.delete_class(class_name)
+        print(f"Building '{class_name}' while '{current}' keeps serving")
+    else:
+        class_name = alias
+
     try:
-        schema = client.schema.get()
-        existing_classes = {c.get('class') for c in schema.get('classes', [])}
-        if class_name not in existing_classes:
-            class_obj = {
-                "class": class_name,
-                "vectorizer": "none",
-                "properties": [
-                    {"name": "text", "dataType": ["text"]},
-                    {"name": "page", "dataType": ["int"]},
-                    {"name": "product_code", "dataType": ["text"]},
-                    {"name": "category", "dataType": ["text"]},
-                    {"name": "source", "dataType": ["text"]},
-                    {"name": "recursive_idx", "dataType": ["int"]},
-                ],
-            }
-            client.schema.create_class(class_obj)
+        if ensure_chunk_class(client, class_name):
             print(f"Created Weaviate class: {class_name}")
     except Exception as schema_err:
+        if blue_green:
+            raise
         print(f"Weaviate schema ensure error: {schema_err}")
 
-    texts = [doc.page_content for doc in chunks]
-    metadatas = [doc.metadata for doc in chunks]
+    report = ingest_documents(
+        s3, bucket_name, keys, embedding_model, client, class_name, ingestion_version,
+        download_workers=download_workers,
+        parse_workers=parse_workers or (1 if len(keys) == 1 else None),
+        num_workers=WEAVIATE_BATCH_WORKERS if blue_green else 1,
+    )
+    print(report.summary())
+    print(f"Weaviate class '{class_name}' (ingestion_version={ingestion_version})")
 
-    vectors = embedding_model.embed_documents(texts)
+    if blue_green:
+        problems = [f"{len(report.failed)} documents failed"] if report.failed else []
+        if not problems:
+            ids = validation_ids
+            if not ids:
+                found = report.community_ids
+                if not found:
+                    try:
+                        found = community_ids_in_class(client, current)
+                    except Exception as e:
+                        print(f"Could not sample community IDs from '{current}': {e}")
+                ids = sample_community_ids(found)
+            print(f"Validating '{class_name}' with communities: {', '.join(ids) or '-'}")
+            problems = validate_index(client, class_name, embedding_model, ids, report.ingested_chunks)
+        if problems:
+            client.schema.delete_class(class_name)
+            raise RuntimeError(
+                f"Validation of '{class_name}' failed, alias '{alias}' unchanged: " + "; ".join(problems)
+            )
+        previous = set_alias(client, alias, class_name)
+        print(f"Alias '{alias}' now points to '{class_name}' (was '{previous or alias}')")
+        dropped = garbage_collect(client, alias, keep=keep_versions)
+        if dropped:
+            print(f"Dropped old versions: {', '.join(dropped)}")
+
+    if report.ingested_chunks:
+        # Invalidate cached cart results that were computed from the old index.
+        bump_data_version("subsidy_index")
+    return report
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Embed subsidy PDFs from S3 into Weaviate")
+    parser.add_argument("--prefix", default=None,
+                        help="Ingest every PDF under this prefix of BUCKET_NAME instead of OBJECT_KEY")
+    parser.add_argument("--download-workers", type=int, default=8, help="Concurrent S3 downloads (default 8)")
+    parser.add_argument("--parse-workers", type=int, default=None, help="PDF parsing processes (default: CPU count)")
+    parser.add_argument("--blue-green", action="store_true",
+                        help="Build a new versioned class and switch the WEAVIATE_CLASS_NAME alias once it validates")
+    parser.add_argument("--keep", type=int, default=2, help="Versioned classes to keep after a switch (default 2)")
+    parser.add_argument("--validation-ids", default=None,
+                        help="File with one community ID per line to validate a blue/green build with "
+                             "(default: sampled from the ingested chunks)")
+    args = parser.parse_args()
+
+    validation_ids = None
+    if args.validation_ids:
+        with open(args.validation_ids) as f:
+            validation_ids = [line.strip() for line in f if line.strip()]
+    report = generate_vectorstore(
+        blue_green=args.blue_green,
+        keep_versions=args.keep,
+        validation_ids=validation_ids,
+        prefix=args.prefix,
+        download_workers=args.download_workers,
+        parse_workers=args.parse_workers,
+    )
+    return 1 if report.failed else 0
 
-    client.batch.configure(batch_size=64)
-    with client.batch as batch:
-        for content, metadata, vector in zip(texts, metadatas, vectors):
-            props = {
-                "text": content,
-                "page": int(metadata.get("page") or 0),
-                "product_code": metadata.get("product_code"),
-                "category": metadata.get("category"),
-                "source": metadata.get("source", "recursive"),
-                "recursive_idx": int(metadata.get("recursive_idx") or 0),
-            }
-            batch.add_data_object(data_object=props, class_name=class_name, vector=vector)
 
-    print(f"Ingested {len(texts)} chunks into Weaviate class '{class_name}'")
 if __name__ == "__main__":
-    generate_vectorstore()
\ No newline at end of file
+    sys.exit(main())
@@ -1,9 +1,16 @@
 import os
 import sys
+import time
 import argparse
 from dotenv import load_dotenv, find_dotenv
 from weaviate import Client as V3Client  # v3 client
 from weaviate.auth import AuthApiKey
+from index_alias import garbage_collect, list_versions, read_alias, set_alias
+from tiered_cache import bump_data_version
+from weaviate_schema import chunk_class, ensure_chunk_class
+
+LEGACY_INGESTION_VERSION = "legacy"
+BACKFILL_PAGE_SIZE = 500
 
 def connect_v3(url: str, api_key: str | None) -> V3Client:
     if api_key:
@@ -20,28 +27,120 @@ def class_exists(client: V3Client, class_name: str) -> bool:
 def drop_class(client: V3Client, class_name: str) -> None:
     if class_exists(client, class_name):
         client.schema.delete_class(class_name)
+        bump_data_version("subsidy_index")
 
 def recreate_class(client: V3Client, class_name: str) -> None:
-    client.schema.create_class({
-        "class": class_name,
-        "vectorizer": "none",
-        "properties": [
-            {"name": "text", "dataType": ["text"]},
-            {"name": "page", "dataType": ["int"]},
-            {"name": "product_code", "dataType": ["text"]},
-            {"name": "category", "dataType": ["text"]},
-            {"name": "source", "dataType": ["text"]},
-            {"name": "recursive_idx", "dataType": ["int"]},
-        ],
-    })
+    client.schema.create_class(chunk_class(class_name))
+
+
+def build_where(source_object: str | None = None, source: str | None = None, page_from: int | None = None,
+                page_to: int | None = None, ingestion_version: str | None = None) -> dict | None:
+    """Combine the selected chunk filters into one GraphQL `where` clause."""
+    operands = []
+    if source_object:
+        operands.append({"path": ["source_object"], "operator": "Equal", "valueText": source_object})
+    if source:
+        operands.append({"path": ["source"], "operator": "Equal", "valueText": source})
+    if page_from is not None:
+        operands.append({"path": ["page"], "operator": "GreaterThanEqual", "valueInt": page_from})
+    if page_to is not None:
+        operands.append({"path": ["page"], "operator": "LessThanEqual", "valueInt": page_to})
+    if ingestion_version:
+        operands.append({"path": ["ingestion_version"], "operator": "Equal", "valueText": ingestion_version})
+    if not operands:
+        return None
+    return operands[0] if len(operands) == 1 else {"operator": "And", "operands": operands}
+
+
+def backfill_legacy(client: V3Client, class_name: str, source_object: str, dry_run: bool = False) -> int:
+    """Tag chunks ingested before source tracking so the selective filters can match them.
+
+    The old single-document ingest stored no `source_object` or
+    `ingestion_version`, and tagged semantic chunks "recursive" as well. Each
+    untagged object gets `source_object`, `ingestion_version` "legacy", and
+    `source` "semantic" when it has a `product_code`, which only semantic
+    chunks carry. A semantic chunk from before a page's first product code
+    cannot be told apart and stays "recursive". Returns the number of
+    objects tagged, or that would be with `dry_run`.
+    """
+    if not dry_run:
+        ensure_chunk_class(client, class_name)
+    tagged = 0
+    after = None
+    while True:
+        resp = client.data_object.get(class_name=class_name, limit=BACKFILL_PAGE_SIZE, after=after)
+        objects = resp.get("objects") or []
+        if not objects:
+            break
+        for obj in objects:
+            props = obj.get("properties") or {}
+            if props.get("source_object"):
+                continue
+            patch = {"source_object": source_object, "ingestion_version": LEGACY_INGESTION_VERSION}
+            if props.get("product_code"):
+                patch["source"] = "semantic"
+            if not dry_run:
+                client.data_object.update(data_object=patch, class_name=class_name, uuid=obj["id"])
+            tagged += 1
+        after = objects[-1]["id"]
+        print(f"  {tagged} objects {'to tag' if dry_run else 'tagged'} so far")
+    return tagged
+
+
+def count_matching(client: V3Client, class_name: str, where: dict) -> int:
+    resp = client.query.aggregate(class_name).with_where(where).with_meta_count().do()
+    groups = resp.get("data", {}).get("Aggregate", {}).get(class_name) or [{}]
+    return int(groups[0].get("meta", {}).get("count") or 0)
+
+
+def delete_matching(client: V3Client, class_name: str, where: dict, total: int) -> tuple[int, int]:
+    """Batch-delete objects matching `where`, reporting progress per round.
+
+    Weaviate caps each batch delete at QUERY_MAXIMUM_RESULTS objects, so this
+    repeats until nothing matches. Returns `(deleted, failed)`.
+    """
+    deleted = failed = 0
+    started = time.time()
+    while True:
+        resp = client.batch.delete_objects(class_name=class_name, where=where, output="minimal")
+        results = resp.get("results", {})
+        successful = int(results.get("successful") or 0)
+        deleted += successful
+        failed += int(results.get("failed") or 0)
+        elapsed = max(time.time() - started, 1e-6)
+        pct = f" ({deleted / total:.0%})" if total else ""
+        print(f"  deleted {deleted}/{total}{pct}, {failed} failed, {deleted / elapsed:.0f} objects/s")
+        if not results.get("matches") or successful == 0:
+            break
+    return deleted, failed
 
 
 def main() -> int:
-    parser = argparse.ArgumentParser(description="Delete embeddings in Weaviate (v3 client)")
+    parser = argparse.ArgumentParser(description="Delete embeddings in Weaviate (v3 client), whole class or by filter")
     parser.add_argument("--drop-class", action="store_true", help="Drop the entire class (deletes all objects)")
     parser.add_argument("--recreate", action="store_true", help="Recreate the class after dropping it")
     parser.add_argument("--class-name", default=None, help="Override class name (defaults to WEAVIATE_CLASS_NAME)")
     parser.add_argument("--host", default=None, help="Override host URL (defaults to WEAVIATE_HOST)")
+    selective = parser.add_argument_group(
+        "selective delete (combined with AND)",
+        "Chunks ingested before source tracking have no source_object or ingestion_version, and their "
+        "semantic chunks are tagged 'recursive', so these filters do not match them until they are tagged "
+        "with --backfill-legacy.",
+    )
+    selective.add_argument("--source-object", default=None, help="S3 object key the chunks were ingested from")
+    selective.add_argument("--source", choices=["semantic", "recursive"], default=None, help="Chunk source kind")
+    selective.add_argument("--page-from", type=int, default=None, help="First page to delete (inclusive)")
+    selective.add_argument("--page-to", type=int, default=None, help="Last page to delete (inclusive)")
+    selective.add_argument("--ingestion-version", default=None, help="Ingestion run to delete")
+    selective.add_argument("--dry-run", action="store_true", help="Only count matching objects")
+    selective.add_argument("--backfill-legacy", default=None, metavar="OBJECT_KEY",
+                           help="Tag untagged (pre-tracking) chunks with this S3 key, ingestion_version 'legacy' "
+                                "and source 'semantic' where they have a product code; honours --dry-run")
+    versions = parser.add_argument_group("blue/green versions (the class name is the alias)")
+    versions.add_argument("--list-versions", action="store_true", help="List versioned classes and the alias target")
+    versions.add_argument("--set-alias", default=None, metavar="CLASS", help="Repoint the alias, e.g. to roll back")
+    versions.add_argument("--gc-versions", action="store_true", help="Drop old versioned classes")
+    versions.add_argument("--keep", type=int, default=2, help="Versions kept by --gc-versions (default 2)")
     args = parser.parse_args()
 
     load_dotenv(find_dotenv())
@@ -52,6 +151,59 @@ def main() -> int:
 
     client = connect_v3(host, api_key)
 
+    if args.list_versions or args.set_alias or args.gc_versions:
+        if args.set_alias:
+            if not class_exists(client, args.set_alias):
+                parser.error(f"--set-alias target '{args.set_alias}' does not exist")
+            previous = set_alias(client, class_name, args.set_alias)
+            bump_data_version("subsidy_index")
+            print(f"Alias '{class_name}' now points to '{args.set_alias}' (was '{previous or class_name}').")
+        if args.gc_versions:
+            dropped = garbage_collect(client, class_name, keep=args.keep)
+            print(f"Dropped {len(dropped)} old versions: {', '.join(dropped) or '-'}")
+        if args.list_versions:
+            current = read_alias(client, class_name) or class_name
+            for version in list_versions(client, class_name):
+                print(f"{'*' if version == current else ' '} {version}")
+            print(f"Alias '{class_name}' -> '{current}'")
+        return 0
+
+    if args.backfill_legacy:
+        if not args.class_name:
+            class_name = read_alias(client, class_name) or class_name
+        if not class_exists(client, class_name):
+            print(f"Class '{class_name}' does not exist; nothing to backfill.")
+            return 0
+        tagged = backfill_legacy(client, class_name, args.backfill_legacy, dry_run=args.dry_run)
+        if args.dry_run:
+            print(f"Dry run: {tagged} untagged objects in '{class_name}' would be tagged")
+        else:
+            print(f"Tagged {tagged} objects in '{class_name}' with source_object={args.backfill_legacy}")
+        return 0
+
+    where = build_where(args.source_object, args.source, args.page_from, args.page_to, args.ingestion_version)
+    if where is not None:
+        if args.drop_class:
+            parser.error("--drop-class cannot be combined with selective delete filters")
+        if not args.class_name:
+            # Selective deletes apply to the class currently serving reads.
+            class_name = read_alias(client, class_name) or class_name
+        if not class_exists(client, class_name):
+            print(f"Class '{class_name}' does not exist; nothing to delete.")
+            return 0
+        total = count_matching(client, class_name, where)
+        if args.dry_run:
+            print(f"Dry run: {total} objects in '{class_name}' match {where}")
+            return 0
+        print(f"Deleting {total} objects from '{class_name}' matching {where} …")
+        deleted, failed = delete_matching(client, class_name, where, total)
+        if deleted:
+            bump_data_version("subsidy_index")
+        print(f"Deleted {deleted} objects ({failed} failed).")
+        return 1 if failed else 0
+    if args.dry_run:
+        parser.error("--dry-run needs at least one selective delete filter")
+
     if args.drop_class:
         if not class_exists(client, class_name):
             print(f"Class '{class_name}' does not exist; nothing to drop.")
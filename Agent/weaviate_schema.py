@@ -0,0 +1,36 @@
+"""Weaviate schema for ingested PDF chunks, shared by ingestion and cleanup.
+
+`source_object` (the S3 key a chunk came from) and `ingestion_version` let
+cleanup delete a single document or ingestion run instead of the whole class.
+"""
+
+from weaviate import Client as V3Client  # v3 client
+
+CHUNK_PROPERTIES = [
+    {"name": "text", "dataType": ["text"]},
+    {"name": "page", "dataType": ["int"]},
+    {"name": "product_code", "dataType": ["text"]},
+    {"name": "category", "dataType": ["text"]},
+    {"name": "source", "dataType": ["text"]},
+    {"name": "recursive_idx", "dataType": ["int"]},
+    {"name": "source_object", "dataType": ["text"], "tokenization": "field"},
+    {"name": "ingestion_version", "dataType": ["text"], "tokenization": "field"},
+]
+
+
+def chunk_class(class_name: str) -> dict:
+    return {"class": class_name, "vectorizer": "none", "properties": CHUNK_PROPERTIES}
+
+
+def ensure_chunk_class(client: V3Client, class_name: str) -> bool:
+    """Create `class_name` or add any missing chunk properties; True if created."""
+    schema = client.schema.get()
+    existing = next((c for c in schema.get("classes", []) if c.get("class") == class_name), None)
+    if existing is None:
+        client.schema.create_class(chunk_class(class_name))
+        return True
+    have = {p.get("name") for p in existing.get("properties", [])}
+    for prop in CHUNK_PROPERTIES:
+        if prop["name"] not in have:
+            client.schema.property.create(class_name, prop)
+    return False
@@ -0,0 +1,105 @@
+"""Process-wide agents and read-only resources for Celery workers.
+
+Tasks used to build a `ProductDetailAgent` and an `Agent2` per cart. These
+helpers keep one of each per process instead:
+
+- `get_product_agent()` returns a shared `ProductDetailAgent`, swapped only
+  when Postgres reports a new catalog version (checked at most every
+  AGENT_CATALOG_CHECK_SECONDS).
+- `get_community_agent(community_id, subsidy_version)` returns a cached
+  `Agent2`, so its retrieved context is reused by later carts for the same
+  community until the subsidy index version (the class the alias resolves
+  to, plus the ingestion counter) changes; without a version (cache Redis
+  down), a fresh agent is built every time. An agent whose retrieval came
+  back empty (Weaviate down, breaker open) is replaced on the next lookup
+  rather than served for good, as app.py does.
+
+`preload()` loads the catalog, the embedding model and the LLM clients once.
+celery_app calls it from `worker_init`, which under the prefork pool runs in
+the parent before the children fork, so the children share those pages
+copy-on-write instead of each loading its own copy. `gc.freeze()` then moves
+the preloaded objects out of the collector's reach: otherwise the first
+collection in each child would write to every object header and copy the
+pages anyway.
+
+Loading the catalog does query Postgres from the parent (for the catalog
+version, and for the rows when no snapshot exists yet). Each query uses its
+own engine, which is disposed before `load_catalog` returns, so children
+inherit no open connection. Weaviate, cache Redis and the LLM APIs are first
+contacted from the children.
+
+Environment variables:
+- AGENT_CATALOG_CHECK_SECONDS (default 60)
+- AGENT_COMMUNITY_CACHE_SIZE (default 256 communities per process)
+"""
+
+import gc
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from agent1_module import ProductDetailAgent
+from Agent2 import Agent2
+from catalog_snapshot import current_catalog_version
+
+AGENT_CATALOG_CHECK_SECONDS = float(os.getenv("AGENT_CATALOG_CHECK_SECONDS", "60"))
+AGENT_COMMUNITY_CACHE_SIZE = int(os.getenv("AGENT_COMMUNITY_CACHE_SIZE", "256"))
+
+_product_agent: Optional[ProductDetailAgent] = None
+_product_agent_checked = 0.0
+_community_agents: "OrderedDict[tuple, Agent2]" = OrderedDict()
+_lock = threading.Lock()
+
+
+def get_product_agent() -> ProductDetailAgent:
+    global _product_agent, _product_agent_checked
+    if _product_agent is not None and time.time() - _product_agent_checked < AGENT_CATALOG_CHECK_SECONDS:
+        return _product_agent
+    with _lock:
+        if _product_agent is None:
+            _product_agent = ProductDetailAgent()
+        elif time.time() - _product_agent_checked >= AGENT_CATALOG_CHECK_SECONDS:
+            version = current_catalog_version(_product_agent.db_url)
+            # Keep the loaded (and possibly fork-shared) agent unless the catalog really changed.
+            if version and version != _product_agent.catalog_version:
+                _product_agent = ProductDetailAgent()
+        _product_agent_checked = time.time()
+    return _product_agent
+
+
+def get_community_agent(community_id: str, subsidy_version: Optional[str] = None) -> Agent2:
+    if subsidy_version is None:
+        # Version unknown (cache Redis down): a cached context could predate a re-ingest.
+        return Agent2(community_id)
+    key = (community_id.strip(), subsidy_version)
+    with _lock:
+        agent = _community_agents.get(key)
+        if agent is not None and not agent.context_missing:
+            _community_agents.move_to_end(key)
+            return agent
+        agent = Agent2(community_id)
+        _community_agents[key] = agent
+        while len(_community_agents) > AGENT_COMMUNITY_CACHE_SIZE:
+            _community_agents.popitem(last=False)
+    return agent
+
+
+def preload() -> None:
+    """Load read-only resources now, before the pool starts its workers."""
+    import shared
+
+    started = time.perf_counter()
+    agent = get_product_agent()
+    agent.catalog.norm_list  # built lazily otherwise, i.e. once per child
+    shared.embedding_model.load()
+    shared.get_llm("large")
+    if shared.LLM_FAST_MODEL:
+        shared.get_llm("fast")
+    gc.collect()
+    gc.freeze()
+    print(
+        f"Preloaded catalog {agent.catalog_version} ({len(agent.catalog)} rows), embeddings and LLM clients "
+        f"in {time.perf_counter() - started:.1f}s"
+    )